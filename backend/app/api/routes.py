@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from app.routers import auth_router, product_router, cart_router, payment_router, checkout_router
+from app.routers import auth_router, product_router, cart_router, payment_router, checkout_router, metrics_router, jobs_router, image_router
 
 router = APIRouter()
 
@@ -9,3 +9,6 @@ router.include_router(product_router)
 router.include_router(cart_router)
 router.include_router(payment_router)
 router.include_router(checkout_router)
+router.include_router(metrics_router)
+router.include_router(jobs_router)
+router.include_router(image_router)
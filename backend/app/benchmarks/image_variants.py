@@ -0,0 +1,107 @@
+# app/benchmarks/image_variants.py
+"""
+Micro-benchmark de la generación de variantes de imagen.
+
+    python -m app.benchmarks.image_variants
+    python -m app.benchmarks.image_variants --image foto.jpg --runs 5
+
+Compara el método anterior (una copia a resolución completa por tamaño) con
+generate_variants (una decodificación con draft, cascada y WebP en paralelo).
+Cada modo corre en un proceso nuevo para medir su pico de RSS por separado.
+"""
+import argparse
+import io
+import multiprocessing
+import resource
+import sys
+import time
+
+from PIL import Image
+
+from app.services.image_variants import IMAGE_SIZES
+
+
+def legacy_variants(data: bytes):
+    """Implementación previa de save_product_images_cloudinary, sin la subida."""
+    image = Image.open(io.BytesIO(data)).convert("RGB")
+    result = {}
+    for size_name, size in IMAGE_SIZES.items():
+        img_copy = image.copy()
+        img_copy.thumbnail(size)
+        buffer = io.BytesIO()
+        img_copy.save(buffer, format="WEBP", quality=80, optimize=True)
+        result[size_name] = buffer.getvalue()
+    return result
+
+
+def synthetic_photo(width: int, height: int) -> bytes:
+    """JPEG con degradado y ruido, parecido en tamaño a una foto de teléfono."""
+    gradient = Image.linear_gradient("L").resize((width, height))
+    noise = Image.effect_noise((width, height), 64)
+    image = Image.merge("RGB", (gradient, noise, gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT)))
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def _max_rss_mb(who) -> float:
+    # ru_maxrss está en KiB en Linux (bytes en macOS)
+    value = resource.getrusage(who).ru_maxrss
+    return value / (1024 * 1024) if sys.platform == "darwin" else value / 1024
+
+
+def _worker(mode: str, data: bytes, runs: int, queue):
+    if mode == "legacy":
+        func = legacy_variants
+    else:
+        from app.services.image_variants import generate_variants, shutdown_encode_pool
+        func = generate_variants
+
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func(data)
+        timings.append(time.perf_counter() - start)
+
+    if mode != "legacy":
+        shutdown_encode_pool()
+    queue.put({
+        "mode": mode,
+        "first_s": timings[0],
+        "best_s": min(timings),
+        "rss_mb": _max_rss_mb(resource.RUSAGE_SELF),
+        "children_rss_mb": _max_rss_mb(resource.RUSAGE_CHILDREN),
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--image", help="Imagen a procesar (por defecto, una foto sintética)")
+    parser.add_argument("--width", type=int, default=4032)
+    parser.add_argument("--height", type=int, default=3024)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.image:
+        with open(args.image, "rb") as f:
+            data = f.read()
+    else:
+        data = synthetic_photo(args.width, args.height)
+    with Image.open(io.BytesIO(data)) as probe:
+        print(f"Imagen: {probe.format} {probe.size[0]}x{probe.size[1]}, {len(data) / 1024:.0f} KiB")
+
+    context = multiprocessing.get_context("spawn")
+    for mode in ("legacy", "variants"):
+        queue = context.Queue()
+        process = context.Process(target=_worker, args=(mode, data, args.runs, queue))
+        process.start()
+        result = queue.get()
+        process.join()
+        print(
+            f"{result['mode']:>8}: primera={result['first_s'] * 1000:.0f}ms mejor={result['best_s'] * 1000:.0f}ms "
+            f"RSS pico={result['rss_mb']:.0f}MB (pool de codificación: {result['children_rss_mb']:.0f}MB)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# app/benchmarks/jwt_decode.py
+"""
+Micro-benchmark de la verificación de tokens JWT (HS256).
+
+    python -m app.benchmarks.jwt_decode
+    python -m app.benchmarks.jwt_decode --iterations 50000
+
+Compara python-jose (el backend actual), PyJWT (si está instalado) y
+decode_access_token con la cache de tokens verificados (token repetido,
+que es el caso normal en una sesión).
+"""
+import argparse
+import time
+from datetime import timedelta
+
+from jose import jwt as jose_jwt
+
+from app.core.security import ALGORITHM, SECRET_KEY, create_access_token, decode_access_token, token_cache
+
+try:
+    import jwt as pyjwt
+except ImportError:  # dependencia opcional, solo para comparar
+    pyjwt = None
+
+
+def measure(label: str, func, iterations: int):
+    func()  # calentamiento
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    per_call_us = (time.perf_counter() - start) / iterations * 1_000_000
+    print(f"{label:<32} {per_call_us:>10.2f} µs/token")
+    return per_call_us
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    token = create_access_token(
+        {"sub": "bench@example.com", "is_admin": False, "user_uuid": "00000000-0000-0000-0000-000000000000"},
+        expires_delta=timedelta(minutes=30),
+    )
+
+    results = {}
+    results["jose"] = measure(
+        "python-jose jwt.decode",
+        lambda: jose_jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]),
+        args.iterations,
+    )
+    if pyjwt is not None:
+        results["pyjwt"] = measure(
+            "PyJWT jwt.decode",
+            lambda: pyjwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]),
+            args.iterations,
+        )
+    else:
+        print(f"{'PyJWT jwt.decode':<32} {'(no instalado: pip install PyJWT)':>10}")
+
+    token_cache.clear()
+    results["cached"] = measure("decode_access_token (cache)", lambda: decode_access_token(token), args.iterations)
+
+    baseline = results["jose"]
+    for name, value in results.items():
+        if name != "jose":
+            print(f"  {name}: {baseline / value:.1f}x más rápido que python-jose")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# app/benchmarks/search.py
+"""
+Benchmark de la búsqueda de productos.
+
+    python -m app.benchmarks.search --products 100000
+    python -m app.benchmarks.search --database   # consultas reales contra DATABASE_URL
+
+Sin --database se mide el índice invertido en memoria con un catálogo sintético.
+Termina con código 1 si el p95 supera el presupuesto (--budget-ms).
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+import uuid
+
+from app.services.search_service import InvertedIndex
+
+WORDS = (
+    "zapato zapatilla camisa camiseta pantalon chaqueta bolso mochila reloj gafas "
+    "cuero algodon lana seda rojo azul negro blanco verde deporte casual elegante "
+    "hombre mujer nino oferta nuevo clasico urbano montaña playa invierno verano"
+).split()
+
+QUERIES = ["zapato", "camisa azul", "cuero negro", "mochila dep", "reloj elegante hombre", "verano", "za", "algodon blanco"]
+
+
+def synthetic_rows(count: int, seed: int = 42):
+    rng = random.Random(seed)
+    # Marcas/modelos sintéticos para un vocabulario realista (~5k términos)
+    vocabulary = WORDS + [f"{rng.choice(WORDS)[:4]}{n}" for n in range(5000)]
+    for _ in range(count):
+        name = " ".join(rng.choices(WORDS, k=1) + rng.choices(vocabulary, k=2))
+        description = " ".join(rng.choices(vocabulary, k=12))
+        yield uuid.uuid4(), name, description
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def run(search, rounds: int):
+    samples = []
+    for _ in range(rounds):
+        for query in QUERIES:
+            start = time.perf_counter()
+            search(query)
+            samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=100_000)
+    parser.add_argument("--rounds", type=int, default=50)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--budget-ms", type=float, default=50.0, help="Presupuesto para el p95")
+    parser.add_argument("--database", action="store_true", help="Usar search_products contra la base configurada")
+    args = parser.parse_args()
+
+    if args.database:
+        from app.core.database import SessionLocal
+        from app.services.search_service import search_products
+
+        db = SessionLocal()
+        try:
+            print(f"Motor: {db.get_bind().dialect.name}")
+            search_products(db, QUERIES[0], limit=args.limit)  # calentamiento
+            samples = run(lambda q: search_products(db, q, limit=args.limit), args.rounds)
+        finally:
+            db.close()
+    else:
+        start = time.perf_counter()
+        index = InvertedIndex().build(synthetic_rows(args.products))
+        print(f"Índice en memoria: {index.size} productos construidos en {time.perf_counter() - start:.2f}s")
+        samples = run(lambda q: index.search(q, limit=args.limit), args.rounds)
+
+    p50, p95, p99 = (percentile(samples, p) for p in (50, 95, 99))
+    print(f"consultas={len(samples)} media={statistics.mean(samples):.2f}ms p50={p50:.2f}ms p95={p95:.2f}ms p99={p99:.2f}ms")
+    if p95 > args.budget_ms:
+        print(f"❌ p95 {p95:.2f}ms supera el presupuesto de {args.budget_ms}ms")
+        sys.exit(1)
+    print(f"✅ p95 dentro del presupuesto de {args.budget_ms}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# app/benchmarks/stock_reservation.py
+"""
+Prueba de carga de la reserva de stock (contra DATABASE_URL).
+
+    python -m app.benchmarks.stock_reservation
+    python -m app.benchmarks.stock_reservation --checkouts 500 --threads 32 --stock 100
+
+Crea productos temporales y lanza checkouts concurrentes que reservan varias
+líneas cada uno (en orden aleatorio, para provocar bloqueos cruzados). Una parte
+de las reservas se libera, como un pago rechazado. Al final comprueba que no se
+vendió más de lo que había y que el stock restante cuadra con lo reservado.
+Termina con código 1 si encuentra alguna inconsistencia.
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from app.core.database import SessionLocal, init_db
+from app.models.product import Product
+from app.services.stock_service import release_stock, reserve_stock
+
+
+def run_checkout(product_ids, max_quantity, decline_rate, seed):
+    rng = random.Random(seed)
+    lines = rng.sample(product_ids, rng.randint(1, len(product_ids)))
+    quantities = {product_id: rng.randint(1, max_quantity) for product_id in lines}
+    db = SessionLocal()
+    try:
+        start = time.perf_counter()
+        reservation = reserve_stock(db, quantities)
+        elapsed = time.perf_counter() - start
+        if reservation.ok and rng.random() < decline_rate:
+            release_stock(db, reservation)
+            return "released", {}, elapsed
+        return ("reserved" if reservation.ok else "rejected"), (quantities if reservation.ok else {}), elapsed
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=5)
+    parser.add_argument("--stock", type=int, default=50)
+    parser.add_argument("--checkouts", type=int, default=300)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--max-quantity", type=int, default=3)
+    parser.add_argument("--decline-rate", type=float, default=0.2)
+    args = parser.parse_args()
+
+    init_db()  # registra los modelos y crea las tablas que falten
+    db = SessionLocal()
+    product_ids = []
+    for i in range(args.products):
+        product = Product(name=f"__stock_bench_{uuid.uuid4().hex[:8]}_{i}", price=1.0, stock=args.stock, is_active=True)
+        db.add(product)
+        db.flush()
+        product_ids.append(product.id)
+    db.commit()
+
+    try:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(args.threads) as pool:
+            results = list(pool.map(
+                lambda seed: run_checkout(product_ids, args.max_quantity, args.decline_rate, seed),
+                range(args.checkouts),
+            ))
+        wall = time.perf_counter() - start
+
+        sold = {product_id: 0 for product_id in product_ids}
+        for _, quantities, _ in results:
+            for product_id, quantity in quantities.items():
+                sold[product_id] += quantity
+        remaining = dict(db.query(Product.id, Product.stock).filter(Product.id.in_(product_ids)).all())
+
+        outcomes = {name: sum(1 for outcome, _, _ in results if outcome == name) for name in ("reserved", "released", "rejected")}
+        latencies = sorted(elapsed for _, _, elapsed in results)
+        print(f"{args.checkouts} checkouts en {wall:.2f}s ({args.checkouts / wall:.0f}/s) con {args.threads} hilos: {outcomes}")
+        print(f"latencia reserva: p50 {statistics.median(latencies) * 1000:.1f} ms, "
+              f"p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f} ms")
+
+        errors = []
+        for product_id in product_ids:
+            if remaining[product_id] < 0:
+                errors.append(f"{product_id}: stock negativo ({remaining[product_id]})")
+            if remaining[product_id] + sold[product_id] != args.stock:
+                errors.append(f"{product_id}: restante {remaining[product_id]} + vendido {sold[product_id]} != {args.stock}")
+        for error in errors:
+            print(f"  ERROR {error}")
+        if not errors:
+            print("OK: sin sobreventa y stock consistente")
+    finally:
+        db.query(Product).filter(Product.id.in_(product_ids)).delete(synchronize_session=False)
+        db.commit()
+        db.close()
+
+    if errors:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
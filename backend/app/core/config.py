@@ -19,8 +19,87 @@ class Settings(BaseSettings):
     cloudinary_api_key: str | None = None
     cloudinary_api_secret: str | None = None
 
+    # Almacenamiento de imágenes: "cloudinary" o "local" (direccionado por contenido en static/cas)
+    image_storage_backend: str = "cloudinary"
+    # Prefijo para URLs absolutas del backend local (vacío = rutas relativas /static/...)
+    public_base_url: str = ""
+
     # URL del servicio de mock de pagos
     mock_payment_url: str = "https://mock-payment-kmts.onrender.com"
+    # Cliente HTTP compartido hacia el servicio de pagos
+    payment_http_connect_timeout_seconds: float = 3.0
+    payment_http_read_timeout_seconds: float = 15.0
+    payment_http_max_connections: int = 200
+    payment_http_max_keepalive_connections: int = 50
+    payment_http2: bool = True  # solo si el paquete h2 está instalado
+
+    # Cache en memoria del catálogo público
+    catalog_cache_ttl_seconds: float = 60.0
+    catalog_cache_max_entries: int = 256
+
+    # Cache-Control de las respuestas públicas del catálogo (ETag + revalidación)
+    catalog_http_cache_control: str = "public, max-age=60, stale-while-revalidate=300"
+
+    # Cola de trabajos en segundo plano (procesamiento de imágenes)
+    job_workers: int = 2
+    job_max_attempts: int = 3
+    job_retry_backoff_seconds: float = 2.0
+
+    # Procesos para codificar WebP (0 = codificar en el mismo proceso)
+    image_encode_workers: int = 2
+
+    # Subida multipart de imágenes
+    max_image_upload_bytes: int = 10 * 1024 * 1024
+    upload_tmp_dir: str | None = None
+
+    # Tamaños de imagen a demanda (/images/{id}/{ancho}x{alto}.webp)
+    image_variant_cache_dir: str | None = None  # por defecto backend/.image_cache
+    image_variant_cache_max_bytes: int = 512 * 1024 * 1024
+    image_variant_max_dimension: int = 2048
+    image_variant_cache_control: str = "public, max-age=86400"
+    # Hosts desde los que se descargan originales remotos (separados por comas;
+    # el host de public_base_url se añade solo)
+    image_master_allowed_hosts: str = "res.cloudinary.com"
+
+    # Hashing de contraseñas (bcrypt)
+    bcrypt_rounds: int = 12
+    password_hash_workers: int = 2
+    # Operaciones en vuelo (en cola o ejecutándose) antes de responder 503
+    password_hash_max_pending: int = 16
+    password_hash_retry_after_seconds: int = 1
+
+    # Cache de usuarios autenticados en get_current_user
+    auth_principal_cache_ttl_seconds: float = 30.0
+    auth_principal_cache_max_entries: int = 10000
+    # Confiar en user_uuid / is_admin del token sin consultar la base
+    # (un cambio de rol no se aplica hasta que el token expira)
+    auth_trust_token_claims: bool = False
+
+    # Cache de tokens JWT ya verificados (cada entrada vence, como tarde, con el exp del token)
+    token_cache_max_entries: int = 10000
+    token_cache_max_ttl_seconds: float = 3600.0
+
+    # Rate limit de /auth (token bucket; "memory" = por worker)
+    rate_limit_enabled: bool = True
+    rate_limit_backend: str = "memory"
+    rate_limit_trust_forwarded_for: bool = False
+    rate_limit_login_per_ip_per_minute: float = 20
+    rate_limit_login_per_email_per_minute: float = 5
+    rate_limit_register_per_ip_per_minute: float = 5
+
+    # Almacén de carritos: "database" (un commit por cambio) o "memory"
+    # (en memoria con escritura diferida; requiere un solo worker o afinidad por usuario)
+    cart_store_backend: str = "database"
+    cart_flush_interval_seconds: float = 2.0
+    cart_idle_ttl_seconds: float = 1800.0
+
+    # Idempotency-Key en los endpoints de checkout
+    idempotency_key_ttl_seconds: float = 24 * 3600
+    # Una clave "en curso" más antigua que esto se da por abandonada (proceso caído)
+    idempotency_in_progress_timeout_seconds: float = 120.0
+    # Cuánto espera un duplicado concurrente a que termine la primera ejecución
+    idempotency_wait_timeout_seconds: float = 40.0
+    idempotency_poll_interval_seconds: float = 0.2
 
     # Permite variables extra en el .env
     model_config = SettingsConfigDict(
@@ -1,3 +1,5 @@
+from sqlalchemy import bindparam, inspect, text
+from sqlalchemy.schema import CreateIndex
 from app.db.session import engine, SessionLocal
 from app.db.base_class import Base
 
@@ -20,5 +22,61 @@ def init_db():
     import app.models.cart
     import app.models.payment
     import app.models.payment_attempt
+    import app.models.idempotency_key
 
     Base.metadata.create_all(bind=engine)
+    upgrade_schema()
+
+
+def upgrade_schema():
+    """
+    create_all no modifica tablas que ya existen.
+    Añade las columnas e índices declarados en los modelos que aún falten en la base de datos.
+    """
+    with engine.begin() as connection:
+        inspector = inspect(connection)
+        for table in Base.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    _add_column(connection, table, column)
+            for index in table.indexes:
+                # Respeta Index(...).ddl_if(dialect=...) igual que create_all
+                ddl_if = getattr(index, "_ddl_if", None)
+                if ddl_if is not None and ddl_if.dialect and ddl_if.dialect != connection.dialect.name:
+                    continue
+                # Index(..., info={"before_create": f}): prepara los datos (p. ej. quitar
+                # duplicados antes de un índice único) solo si el índice aún no existe
+                before_create = index.info.get("before_create")
+                if before_create is not None:
+                    if index.name in {existing["name"] for existing in inspector.get_indexes(table.name)}:
+                        continue
+                    before_create(connection)
+                connection.execute(CreateIndex(index, if_not_exists=True))
+
+
+
+def _add_column(connection, table, column):
+    """
+    ALTER TABLE ... ADD COLUMN portable (PostgreSQL y SQLite).
+    Solo se usa un DEFAULT de servidor constante; los defaults de Python se
+    aplican a las filas existentes con un UPDATE.
+    """
+    preparer = connection.dialect.identifier_preparer
+    ddl = (
+        f"ALTER TABLE {preparer.format_table(table)} "
+        f"ADD COLUMN {preparer.format_column(column)} {column.type.compile(dialect=connection.dialect)}"
+    )
+    server_default = getattr(column.server_default, "arg", None)
+    if isinstance(server_default, str):
+        ddl += f" DEFAULT '{server_default}'"
+        if not column.nullable:
+            ddl += " NOT NULL"
+    connection.execute(text(ddl))
+
+    if server_default is None and column.default is not None and not column.default.is_clause_element:
+        value = column.default.arg(None) if column.default.is_callable else column.default.arg
+        backfill = text(
+            f"UPDATE {preparer.format_table(table)} SET {preparer.format_column(column)} = :value"
+        ).bindparams(bindparam("value", type_=column.type))
+        connection.execute(backfill, {"value": value})
\ No newline at end of file
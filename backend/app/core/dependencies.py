@@ -1,18 +1,71 @@
 # backend/app/core/dependencies.py
+from typing import Dict, Optional
+from uuid import UUID
 from fastapi import Depends, HTTPException, status
+from sqlalchemy import event, inspect
 from sqlalchemy.orm import Session
 from fastapi.security import HTTPBearer
 from app.models.user import User
+from app.core.cache import TTLCache
+from app.core.config import settings
 from app.core.database import get_db
 from app.services.auth_service import get_user_by_email
 
 security = HTTPBearer()  # Para extraer token JWT de la cabecera Authorization
 
+# -------------------------
+# Cache de usuarios autenticados (sub -> datos del usuario)
+# -------------------------
+# Se invalida al modificar o borrar un User por el ORM en este proceso; en los
+# demás workers (o con UPDATE masivos) el TTL acota cuánto tarda en verse el cambio.
+principal_cache = TTLCache(
+    maxsize=settings.auth_principal_cache_max_entries,
+    ttl=settings.auth_principal_cache_ttl_seconds
+)
+
+
+def _snapshot(user: User) -> Dict:
+    return {
+        "user_uuid": user.user_uuid,
+        "email": user.email,
+        "full_name": user.full_name,
+        "is_admin": bool(user.is_admin),
+    }
+
+
+def _principal(snapshot: Dict) -> User:
+    # User transitorio (fuera de cualquier sesión): solo expone los datos de identidad
+    return User(**snapshot)
+
+
+def _principal_from_claims(payload: Dict) -> Optional[User]:
+    """Usuario construido solo con el token (auth_trust_token_claims)."""
+    try:
+        user_uuid = UUID(str(payload["user_uuid"]))
+    except (KeyError, ValueError):
+        return None
+    return User(
+        user_uuid=user_uuid,
+        email=payload.get("sub"),
+        full_name=payload.get("name") or "",
+        is_admin=bool(payload.get("is_admin", False)),
+    )
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_principal(mapper, connection, target: User):
+    emails = {target.email, *inspect(target).attrs.email.history.deleted}
+    for email in emails:
+        principal_cache.pop(email)
+
 
 def get_current_user(db: Session = Depends(get_db), token: str = Depends(security)) -> User:
     """
     Devuelve el usuario autenticado a partir del token JWT.
     Levanta 401 si el token es inválido o el usuario no existe.
+    El usuario se resuelve desde la cache (o desde los claims del token si
+    auth_trust_token_claims está activo); la base solo se consulta en un fallo.
     """
     from app.core.security import decode_access_token
 
@@ -23,13 +76,23 @@ def get_current_user(db: Session = Depends(get_db), token: str = Depends(securit
             detail="Invalid token"
         )
 
+    if settings.auth_trust_token_claims:
+        user = _principal_from_claims(payload)
+        if user is not None:
+            return user
+
     email = payload.get("sub")
+    snapshot = principal_cache.get(email)
+    if snapshot is not None:
+        return _principal(snapshot)
+
     user = get_user_by_email(db, email)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="User not found"
         )
+    principal_cache.set(email, _snapshot(user))
     return user
 
 
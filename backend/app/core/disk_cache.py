@@ -0,0 +1,150 @@
+# app/core/disk_cache.py
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+
+class DiskLRUCache:
+    """
+    Cache de archivos en disco acotada en bytes, con expulsión LRU.
+    El índice (clave -> tamaño) vive en memoria y se reconstruye al arrancar a
+    partir de los archivos existentes, ordenados por fecha de último uso.
+
+    get_or_create() deduplica las generaciones en vuelo: si varias peticiones
+    piden la misma clave a la vez, solo la primera ejecuta la función y el resto
+    espera su resultado.
+
+    Se devuelve el contenido, no la ruta: una expulsión puede borrar el archivo
+    en cualquier momento, así que se abre con el lock tomado (la expulsión
+    también lo toma) y se lee del descriptor ya abierto.
+    """
+
+    def __init__(self, root: Path, max_bytes: int, suffix: str = ""):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._in_flight: Dict[str, Future] = {}
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.coalesced = 0
+        self._load()
+
+    def _filename(self, key: str) -> str:
+        return hashlib.sha256(key.encode("utf-8")).hexdigest() + self.suffix
+
+    def _path(self, filename: str) -> Path:
+        return self.root / filename[:2] / filename
+
+    def _load(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        files = []
+        for path in self.root.glob(f"*/*{self.suffix}"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, path.name, stat.st_size))
+        for _, filename, size in sorted(files):
+            self._entries[filename] = size
+            self.size += size
+        self._evict()
+
+    def get(self, key: str) -> Optional[bytes]:
+        filename = self._filename(key)
+        path = self._path(filename)
+        with self._lock:
+            if filename not in self._entries:
+                self.misses += 1
+                return None
+            try:
+                file = open(path, "rb")
+            except FileNotFoundError:
+                # Borrado por fuera (otro worker o limpieza manual)
+                self.size -= self._entries.pop(filename, 0)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(filename)
+            self.hits += 1
+        with file:
+            # La fecha de modificación conserva el orden LRU entre reinicios
+            os.utime(file.fileno())
+            return file.read()
+
+    def put(self, key: str, data: bytes) -> Path:
+        filename = self._filename(key)
+        path = self._path(filename)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                tmp.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        with self._lock:
+            self.size -= self._entries.pop(filename, 0)
+            self._entries[filename] = len(data)
+            self.size += len(data)
+            self._evict()
+        return path
+
+    def get_or_create(self, key: str, factory: Callable[[], bytes]) -> bytes:
+        """Devuelve el contenido de la clave, generándolo con factory() una sola vez si falta."""
+        data = self.get(key)
+        if data is not None:
+            return data
+
+        with self._lock:
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._in_flight[key] = future
+            else:
+                self.coalesced += 1
+        if not owner:
+            return future.result()
+
+        try:
+            data = factory()
+            self.put(key, data)
+            future.set_result(data)
+            return data
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def _evict(self):
+        # Debe llamarse con self._lock tomado
+        while self.size > self.max_bytes and len(self._entries) > 1:
+            filename, size = self._entries.popitem(last=False)
+            self.size -= size
+            self.evictions += 1
+            self._path(filename).unlink(missing_ok=True)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._in_flight),
+            }
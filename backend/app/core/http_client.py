@@ -0,0 +1,75 @@
+# app/core/http_client.py
+import importlib.util
+from typing import Dict, Optional
+
+import httpx
+
+from app.core.config import settings
+from app.core.logger import logger
+
+# HTTP/2 requiere el paquete opcional h2 (pip install "httpx[http2]")
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+class AsyncHttpClient:
+    """
+    Un httpx.AsyncClient por proceso, creado en el lifespan de la app y reutilizado
+    por todas las peticiones: las conexiones (keep-alive) se comparten en un pool
+    y cada llamada tiene timeouts explícitos de conexión y lectura.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        connect_timeout: float,
+        read_timeout: float,
+        max_connections: int,
+        max_keepalive_connections: int,
+        http2: bool = True,
+    ):
+        self.base_url = base_url
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+        )
+        self.http2 = http2 and HTTP2_AVAILABLE
+        self._client: Optional[httpx.AsyncClient] = None
+
+    async def start(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                limits=self.limits,
+                http2=self.http2,
+            )
+            logger.info(f"Cliente HTTP para {self.base_url} (http2={self.http2})")
+
+    async def aclose(self):
+        client, self._client = self._client, None
+        if client is not None:
+            await client.aclose()
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            raise RuntimeError(f"Cliente HTTP para {self.base_url} sin iniciar (se inicia en el lifespan)")
+        return self._client
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.client.post(url, **kwargs)
+
+    def stats(self) -> Dict:
+        return {"base_url": self.base_url, "started": self._client is not None, "http2": self.http2}
+
+
+# Instancia global del servicio de pagos (arranca y se cierra en el lifespan)
+payment_http_client = AsyncHttpClient(
+    base_url=settings.mock_payment_url,
+    connect_timeout=settings.payment_http_connect_timeout_seconds,
+    read_timeout=settings.payment_http_read_timeout_seconds,
+    max_connections=settings.payment_http_max_connections,
+    max_keepalive_connections=settings.payment_http_max_keepalive_connections,
+    http2=settings.payment_http2,
+)
@@ -0,0 +1,218 @@
+# app/core/jobs.py
+import threading
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.core.time_utils import utc_now
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_RETRYING = "retrying"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+
+class Job:
+    """Estado de un trabajo en segundo plano."""
+
+    def __init__(
+        self,
+        name: str,
+        func: Callable,
+        args: tuple,
+        kwargs: dict,
+        max_attempts: int,
+        on_done: Optional[Callable[["Job"], None]] = None,
+    ):
+        self.id = str(uuid.uuid4())
+        self.name = name
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.max_attempts = max_attempts
+        self.on_done = on_done
+        self.attempts = 0
+        self.status = JOB_QUEUED
+        self.error: Optional[str] = None
+        self.result: Any = None
+        self.created_at = utc_now()
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in (JOB_SUCCEEDED, JOB_FAILED)
+
+    def to_dict(self) -> Dict:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "status": self.status,
+            "attempts": self.attempts,
+            "max_attempts": self.max_attempts,
+            "error": self.error,
+            "result": self.result,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobQueue:
+    """
+    Cola de trabajos en memoria con un pool local de hilos.
+    Reintenta con espera exponencial y conserva el historial de los últimos trabajos
+    para consultar su estado. Los trabajos no sobreviven a un reinicio del proceso.
+    """
+
+    def __init__(self, workers: int = 2, max_attempts: int = 3, retry_backoff: float = 2.0, max_history: int = 1000):
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.max_history = max_history
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._timers: Dict[str, threading.Timer] = {}
+        self._lock = threading.Lock()
+        self._closed = False
+        self.counters = {"enqueued": 0, "succeeded": 0, "failed": 0, "retried": 0}
+
+    def start(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="job-worker")
+                self._closed = False
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            self._closed = True
+            for timer in self._timers.values():
+                timer.cancel()
+            # Los que esperaban un reintento ya no se ejecutarán
+            waiting = [self._jobs[job_id] for job_id in self._timers if job_id in self._jobs]
+            self._timers.clear()
+            executor, self._executor = self._executor, None
+        for job in waiting:
+            self._fail(job, "La cola se detuvo antes de reintentar el trabajo")
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+    def enqueue(
+        self,
+        name: str,
+        func: Callable,
+        *args,
+        max_attempts: Optional[int] = None,
+        on_done: Optional[Callable[[Job], None]] = None,
+        **kwargs,
+    ) -> Job:
+        """
+        Encola func(*args, **kwargs). Arranca el pool si aún no está activo.
+        on_done(job) se llama una vez, cuando el trabajo termina con éxito o falla definitivamente.
+        """
+        self.start()
+        job = Job(name, func, args, kwargs, max_attempts or self.max_attempts, on_done=on_done)
+        with self._lock:
+            self._jobs[job.id] = job
+            self.counters["enqueued"] += 1
+            self._prune()
+        self._submit(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def recent(self, limit: int = 50):
+        with self._lock:
+            jobs = list(self._jobs.values())[-limit:]
+        return list(reversed(jobs))
+
+    def _submit(self, job: Job):
+        with self._lock:
+            if self._timers.pop(job.id, None) is None and job.status != JOB_QUEUED:
+                # shutdown() canceló el reintento y ya dio el trabajo por fallido
+                return
+            if not self._closed and self._executor is not None:
+                self._executor.submit(self._run, job)
+                return
+        self._fail(job, "La cola se detuvo antes de ejecutar el trabajo")
+
+    def _run(self, job: Job):
+        job.attempts += 1
+        job.status = JOB_RUNNING
+        job.started_at = job.started_at or utc_now()
+        try:
+            job.result = job.func(*job.args, **job.kwargs)
+        except Exception as e:
+            job.error = f"{e.__class__.__name__}: {e}"
+            if job.attempts < job.max_attempts:
+                delay = self.retry_backoff * (2 ** (job.attempts - 1))
+                job.status = JOB_RETRYING
+                logger.warning(f"Job {job.name} ({job.id}) falló (intento {job.attempts}); reintento en {delay:.1f}s: {job.error}")
+                with self._lock:
+                    self.counters["retried"] += 1
+                    closed = self._closed
+                    if not closed:
+                        timer = threading.Timer(delay, self._submit, args=(job,))
+                        timer.daemon = True
+                        self._timers[job.id] = timer
+                if closed:
+                    self._fail(job, job.error)
+                else:
+                    timer.start()
+                return
+            logger.error(f"Job {job.name} ({job.id}) falló definitivamente:\n{traceback.format_exc()}")
+            self._fail(job, job.error)
+            return
+
+        job.status = JOB_SUCCEEDED
+        job.error = None
+        job.finished_at = utc_now()
+        with self._lock:
+            self.counters["succeeded"] += 1
+        self._finish(job)
+
+    def _fail(self, job: Job, error: str):
+        job.status = JOB_FAILED
+        job.error = error
+        job.finished_at = utc_now()
+        with self._lock:
+            self.counters["failed"] += 1
+        self._finish(job)
+
+    def _finish(self, job: Job):
+        try:
+            if job.on_done is not None:
+                job.on_done(job)
+        except Exception:
+            logger.exception(f"Error en on_done del job {job.name} ({job.id})")
+        finally:
+            # El historial solo guarda el estado: los argumentos (p. ej. imágenes
+            # en base64) se sueltan en cuanto el trabajo termina
+            job.args, job.kwargs = (), {}
+
+    def _prune(self):
+        # Debe llamarse con self._lock tomado; solo descarta trabajos terminados
+        overflow = len(self._jobs) - self.max_history
+        if overflow <= 0:
+            return
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.done][:overflow]:
+            del self._jobs[job_id]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            pending = sum(1 for job in self._jobs.values() if not job.done)
+            return {"workers": self.workers, "pending": pending, **self.counters}
+
+
+# Instancia global (arranca y se detiene en el lifespan de la app)
+job_queue = JobQueue(
+    workers=settings.job_workers,
+    max_attempts=settings.job_max_attempts,
+    retry_backoff=settings.job_retry_backoff_seconds,
+)
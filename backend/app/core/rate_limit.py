@@ -0,0 +1,170 @@
+# app/core/rate_limit.py
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+
+from fastapi import Request
+
+from app.core.config import settings
+
+
+@dataclass(frozen=True)
+class RateLimitRule:
+    """Token bucket: hasta capacity peticiones seguidas, recargando refill_per_second."""
+
+    name: str
+    capacity: float
+    refill_per_second: float
+
+    @classmethod
+    def per_minute(cls, name: str, requests_per_minute: float) -> "RateLimitRule":
+        return cls(name, capacity=requests_per_minute, refill_per_second=requests_per_minute / 60.0)
+
+
+class RateLimitExceeded(Exception):
+    """Se superó una regla; main.py la convierte en 429 con Retry-After."""
+
+    def __init__(self, rule: RateLimitRule, retry_after: float):
+        super().__init__(f"Límite {rule.name} superado")
+        self.rule = rule
+        self.retry_after = retry_after
+
+
+class RateLimitBackend(ABC):
+    """
+    Almacén de buckets. consume() descuenta cost fichas de forma atómica y
+    devuelve (permitido, segundos hasta poder reintentar).
+    Un backend compartido (p. ej. Redis con un script Lua) implementa esta misma
+    interfaz para aplicar los límites entre varios workers.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    def consume(self, key: str, rule: RateLimitRule, cost: float = 1.0) -> Tuple[bool, float]:
+        ...
+
+    def stats(self) -> Dict:
+        return {"backend": self.name}
+
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    """
+    Buckets en memoria del proceso, repartidos en shards con su propio lock para
+    que las peticiones concurrentes no compitan por un único lock.
+    Los límites son por worker: con N workers el límite efectivo es N veces mayor.
+
+    Cada bucket es [fichas, última actualización, momento en que vuelve a estar
+    lleno]. Las reglas comparten shards, así que cada bucket guarda su propio
+    horizonte de recarga: al podar solo se borran los que ya están llenos (no
+    borrarlos no cambia nada). Si aun así el shard está al máximo se expulsa
+    el bucket usado hace más tiempo.
+    """
+
+    name = "memory"
+
+    def __init__(self, shards: int = 16, max_keys_per_shard: int = 10000):
+        self.max_keys_per_shard = max_keys_per_shard
+        self._shards: List[Tuple[threading.Lock, "OrderedDict[str, List[float]]"]] = [
+            (threading.Lock(), OrderedDict()) for _ in range(shards)
+        ]
+        self._evicted = [0] * shards  # por shard: se actualiza con su lock
+
+    def consume(self, key: str, rule: RateLimitRule, cost: float = 1.0) -> Tuple[bool, float]:
+        now = time.monotonic()
+        shard = hash(key) % len(self._shards)
+        lock, buckets = self._shards[shard]
+        with lock:
+            bucket = buckets.get(key)
+            if bucket is None:
+                if len(buckets) >= self.max_keys_per_shard:
+                    self._prune(shard, now)
+                bucket = buckets[key] = [rule.capacity, now, now]
+            else:
+                buckets.move_to_end(key)
+            tokens = min(rule.capacity, bucket[0] + (now - bucket[1]) * rule.refill_per_second)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            bucket[0] = tokens
+            bucket[1] = now
+            bucket[2] = now + (rule.capacity - tokens) / rule.refill_per_second
+            return allowed, 0.0 if allowed else (cost - tokens) / rule.refill_per_second
+
+    def _prune(self, shard: int, now: float):
+        # Debe llamarse con el lock del shard tomado
+        _, buckets = self._shards[shard]
+        for key in [key for key, (_, _, full_at) in buckets.items() if full_at <= now]:
+            del buckets[key]
+        while len(buckets) >= self.max_keys_per_shard:
+            buckets.popitem(last=False)
+            self._evicted[shard] += 1
+
+    def stats(self) -> Dict:
+        return {
+            "backend": self.name,
+            "shards": len(self._shards),
+            "keys": sum(len(b) for _, b in self._shards),
+            "evicted": sum(self._evicted),
+        }
+
+
+class RateLimiter:
+    """Aplica reglas sobre un backend y cuenta peticiones permitidas y rechazadas por regla."""
+
+    def __init__(self, backend: RateLimitBackend, enabled: bool = True):
+        self.backend = backend
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.counters: Dict[str, Dict[str, int]] = {}
+
+    def _count(self, rule: RateLimitRule, outcome: str):
+        with self._lock:
+            counters = self.counters.setdefault(rule.name, {"allowed": 0, "throttled": 0})
+            counters[outcome] += 1
+
+    def hit(self, rule: RateLimitRule, key: str, cost: float = 1.0):
+        """Consume una ficha de la regla para key o lanza RateLimitExceeded."""
+        if not self.enabled:
+            return
+        allowed, retry_after = self.backend.consume(f"{rule.name}:{key}", rule, cost)
+        self._count(rule, "allowed" if allowed else "throttled")
+        if not allowed:
+            raise RateLimitExceeded(rule, retry_after)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            rules = {name: dict(counters) for name, counters in self.counters.items()}
+        return {"enabled": self.enabled, **self.backend.stats(), "rules": rules}
+
+
+def retry_after_header(seconds: float) -> str:
+    return str(max(1, math.ceil(seconds)))
+
+
+def client_ip(request: Request) -> str:
+    """IP del cliente; X-Forwarded-For solo se usa detrás de un proxy de confianza."""
+    if settings.rate_limit_trust_forwarded_for:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+def get_rate_limit_backend() -> RateLimitBackend:
+    if settings.rate_limit_backend == "memory":
+        return MemoryRateLimitBackend()
+    raise ValueError(f"Backend de rate limit no soportado: {settings.rate_limit_backend}")
+
+
+# Instancia global
+rate_limiter = RateLimiter(get_rate_limit_backend(), enabled=settings.rate_limit_enabled)
+
+# Reglas de autenticación (se evalúan antes de cualquier hash bcrypt)
+LOGIN_PER_IP = RateLimitRule.per_minute("login_ip", settings.rate_limit_login_per_ip_per_minute)
+LOGIN_PER_EMAIL = RateLimitRule.per_minute("login_email", settings.rate_limit_login_per_email_per_minute)
+REGISTER_PER_IP = RateLimitRule.per_minute("register_ip", settings.rate_limit_register_per_ip_per_minute)
@@ -1,12 +1,20 @@
+import asyncio
+import hashlib
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from app.models.user import User
 from sqlalchemy.orm import Session
+from app.core.cache import TTLCache
 from app.core.config import settings
 
-# Configuración del hashing de contraseñas
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Configuración del hashing de contraseñas (el costo solo afecta a los hashes nuevos)
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.bcrypt_rounds)
 
 # Clave secreta y algoritmo del token
 SECRET_KEY = getattr(settings, "SECRET_KEY", "supersecretkey")
@@ -14,14 +22,112 @@ ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
 
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
+# bcrypt es lento a propósito: se llama solo desde password_hasher
+# (verify_password_async / get_password_hash_async), nunca en el event loop
+def _verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
-def get_password_hash(password: str) -> str:
+def _get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+# -------------------------
+# Executor acotado para bcrypt
+# -------------------------
+class PasswordHasherBusy(Exception):
+    """La cola de hashing está llena; el endpoint responde 503."""
+
+
+class PasswordHasher:
+    """
+    Ejecuta bcrypt en un pool de hilos propio (bcrypt libera el GIL), separado del
+    threadpool de AnyIO que comparten los endpoints síncronos. Si ya hay
+    max_pending operaciones en vuelo, rechaza en lugar de encolar sin límite.
+    """
+
+    def __init__(self, workers: int = 2, max_pending: int = 16, sample_size: int = 1024):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._queue_waits = deque(maxlen=sample_size)
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+            return self._executor
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def _release(self, _future):
+        with self._lock:
+            self.pending -= 1
+            self.completed += 1
+
+    async def run(self, func: Callable, *args):
+        executor = self._get_executor()
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise PasswordHasherBusy()
+            self.pending += 1
+
+        submitted_at = time.perf_counter()
+
+        def task():
+            self._queue_waits.append(time.perf_counter() - submitted_at)
+            return func(*args)
+
+        try:
+            future = executor.submit(task)
+        except BaseException:
+            # Sin trabajo encolado (p. ej. executor ya detenido) no habrá callback que libere el cupo
+            with self._lock:
+                self.pending -= 1
+            raise
+        # El cupo se libera cuando termina el trabajo, aunque el request se cancele antes
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    def stats(self) -> Dict:
+        waits = sorted(self._queue_waits)
+        p95 = waits[int(len(waits) * 0.95) - 1] if waits else 0.0
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": self.pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "bcrypt_rounds": settings.bcrypt_rounds,
+            "queue_wait_ms_avg": round(sum(waits) / len(waits) * 1000, 2) if waits else 0.0,
+            "queue_wait_ms_p95": round(p95 * 1000, 2),
+            "queue_wait_ms_max": round(waits[-1] * 1000, 2) if waits else 0.0,
+        }
+
+
+password_hasher = PasswordHasher(
+    workers=settings.password_hash_workers,
+    max_pending=settings.password_hash_max_pending,
+)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await password_hasher.run(_verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    return await password_hasher.run(_get_password_hash, password)
+
+
 def create_access_token(data: dict, expires_delta: timedelta | None = None) -> str:
     """
     Crea un token JWT que incluye información del usuario (email, rol, etc.)
@@ -33,12 +139,32 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None) -> s
     return encoded_jwt
 
 
+# Payloads ya verificados, por SHA-256 del token; cada entrada expira con el token
+token_cache = TTLCache(
+    maxsize=settings.token_cache_max_entries,
+    ttl=settings.token_cache_max_ttl_seconds
+)
+
+
 def decode_access_token(token: str) -> dict | None:
     """
-    Decodifica un token JWT y devuelve el contenido (payload)
+    Decodifica un token JWT y devuelve el contenido (payload).
+    La firma se verifica una sola vez por token; las siguientes llamadas son una
+    búsqueda en token_cache hasta el exp del token.
     """
+    key = hashlib.sha256(token.encode("utf-8")).digest()
+    payload = token_cache.get(key)
+    if payload is not None:
+        return dict(payload)
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
     except JWTError:
         return None
+
+    exp = payload.get("exp")
+    if isinstance(exp, (int, float)):
+        ttl = min(exp - time.time(), settings.token_cache_max_ttl_seconds)
+        if ttl > 0:
+            token_cache.set(key, dict(payload), ttl=ttl)
+    return payload
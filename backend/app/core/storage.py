@@ -0,0 +1,139 @@
+# app/core/storage.py
+import hashlib
+import io
+import os
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional
+
+import cloudinary
+import cloudinary.uploader
+from dotenv import load_dotenv
+
+from app.core.config import settings
+
+load_dotenv()  # Cargar variables de entorno desde .env
+
+# backend/static (servido en /static)
+STATIC_DIR = Path(__file__).resolve().parent.parent.parent / "static"
+
+CONTENT_TYPE_EXTENSIONS = {
+    "image/webp": "webp",
+    "image/jpeg": "jpg",
+    "image/png": "png",
+    "image/gif": "gif",
+}
+
+
+class ImageStorage(ABC):
+    """
+    Interfaz de almacenamiento de imágenes.
+    save() recibe los bytes ya procesados y devuelve la URL pública.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    def save(self, data: bytes, name: str, content_type: str = "image/webp") -> str:
+        ...
+
+    def stats(self) -> dict:
+        return {"backend": self.name}
+
+
+class CloudinaryStorage(ImageStorage):
+    """Sube cada archivo a Cloudinary con un public_id estable (se sobrescribe)."""
+
+    name = "cloudinary"
+
+    def __init__(self, folder: str = "products"):
+        self.folder = folder
+        cloudinary.config(
+            cloud_name=settings.cloudinary_cloud_name or os.getenv("CLOUDINARY_CLOUD_NAME"),
+            api_key=settings.cloudinary_api_key or os.getenv("CLOUDINARY_API_KEY"),
+            api_secret=settings.cloudinary_api_secret or os.getenv("CLOUDINARY_API_SECRET"),
+            secure=True
+        )
+
+    def save(self, data: bytes, name: str, content_type: str = "image/webp") -> str:
+        result = cloudinary.uploader.upload(
+            io.BytesIO(data),
+            folder=self.folder,
+            public_id=name,
+            format=CONTENT_TYPE_EXTENSIONS.get(content_type, "webp"),
+            overwrite=True
+        )
+        return result["secure_url"]
+
+
+class LocalContentAddressedStorage(ImageStorage):
+    """
+    Guarda cada archivo en disco bajo el hash SHA-256 de su contenido
+    (<raíz>/<ab>/<sha256>.<ext>). Un mismo contenido se guarda una sola vez y su
+    URL nunca cambia, así que puede servirse con caché inmutable.
+    """
+
+    name = "local"
+
+    def __init__(self, root: Path, url_prefix: str):
+        self.root = Path(root)
+        self.url_prefix = url_prefix.rstrip("/")
+        self._lock = threading.Lock()
+        self.stored = 0
+        self.deduplicated = 0
+
+    def _relative_path(self, data: bytes, content_type: str) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        extension = CONTENT_TYPE_EXTENSIONS.get(content_type, "bin")
+        return f"{digest[:2]}/{digest}.{extension}"
+
+    def save(self, data: bytes, name: str, content_type: str = "image/webp") -> str:
+        relative = self._relative_path(data, content_type)
+        path = self.root / relative
+        if path.exists():
+            with self._lock:
+                self.deduplicated += 1
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Escritura atómica: nunca se sirve un archivo a medio escribir
+            fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as tmp:
+                    tmp.write(data)
+                os.replace(tmp_path, path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.unlink(tmp_path)
+                raise
+            with self._lock:
+                self.stored += 1
+        return f"{self.url_prefix}/{relative}"
+
+    def path_for(self, url: str) -> Optional[Path]:
+        """Ruta en disco de una URL generada por este backend (o None si no le pertenece)."""
+        prefix = self.url_prefix + "/"
+        if not url or not url.startswith(prefix):
+            return None
+        path = (self.root / url[len(prefix):]).resolve()
+        if self.root.resolve() not in path.parents:
+            return None
+        return path
+
+    def stats(self) -> dict:
+        return {"backend": self.name, "stored": self.stored, "deduplicated": self.deduplicated}
+
+
+@lru_cache()
+def get_image_storage() -> ImageStorage:
+    """Backend configurado en settings.image_storage_backend ("cloudinary" o "local")."""
+    if settings.image_storage_backend == "local":
+        return LocalContentAddressedStorage(
+            root=STATIC_DIR / "cas",
+            url_prefix=f"{settings.public_base_url.rstrip('/')}/static/cas",
+        )
+    if settings.image_storage_backend == "cloudinary":
+        return CloudinaryStorage()
+    raise ValueError(f"Backend de imágenes no soportado: {settings.image_storage_backend}")
@@ -0,0 +1,55 @@
+# app/core/timing.py
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict
+
+
+class StageTimings:
+    """
+    Acumula la duración de las etapas de un flujo (conteo, media, máximo y la
+    última medición) para exponerlas en /metrics.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages: Dict[str, Dict[str, float]] = {}
+
+    def record(self, stage: str, seconds: float):
+        with self._lock:
+            stats = self._stages.setdefault(stage, {"count": 0, "total": 0.0, "max": 0.0, "last": 0.0})
+            stats["count"] += 1
+            stats["total"] += seconds
+            stats["max"] = max(stats["max"], seconds)
+            stats["last"] = seconds
+
+    def record_all(self, timings: Dict[str, float]):
+        for stage, seconds in timings.items():
+            self.record(stage, seconds)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                stage: {
+                    "count": int(stats["count"]),
+                    "avg_ms": round(stats["total"] / stats["count"] * 1000, 2),
+                    "max_ms": round(stats["max"] * 1000, 2),
+                    "last_ms": round(stats["last"] * 1000, 2),
+                }
+                for stage, stats in self._stages.items()
+            }
+
+
+@contextmanager
+def timed(timings: Dict[str, float], stage: str):
+    """Guarda en timings[stage] los segundos que tarda el bloque (también si falla)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = time.perf_counter() - start
+
+
+def server_timing_header(timings: Dict[str, float]) -> str:
+    """Cabecera Server-Timing (visible en las devtools del navegador), en milisegundos."""
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items())
@@ -0,0 +1,104 @@
+# app/core/uploads.py
+import os
+import re
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+from fastapi import HTTPException, UploadFile
+from fastapi.responses import JSONResponse
+from PIL import Image, UnidentifiedImageError
+
+from app.core.config import settings
+
+CHUNK_SIZE = 1024 * 1024
+ALLOWED_IMAGE_FORMATS = {"JPEG", "PNG", "WEBP", "GIF"}
+
+# Margen para los campos de texto y las cabeceras de cada parte del multipart
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+
+class UploadSizeLimitMiddleware:
+    """
+    Limita el cuerpo de las peticiones cuya ruta coincide con path_pattern.
+
+    Starlette lee el multipart completo (y lo vuelca a disco) antes de llamar al
+    endpoint, así que el límite tiene que aplicarse aquí: con un Content-Length
+    mayor se responde 413 sin leer nada, y sin él (chunked) la lectura se corta
+    con 413 en cuanto se recibe un byte de más.
+    """
+
+    def __init__(self, app, path_pattern: str, max_body_bytes: int):
+        self.app = app
+        self.path_pattern = re.compile(path_pattern)
+        self.max_body_bytes = max_body_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.path_pattern.match(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > self.max_body_bytes:
+            response = JSONResponse(status_code=413, content={"detail": "Imagen demasiado grande"})
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_bytes:
+                    # FastAPI deja pasar HTTPException al leer el formulario: llega como 413
+                    raise HTTPException(status_code=413, detail="Imagen demasiado grande")
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+def sniff_image_format(source) -> Optional[str]:
+    """
+    Formato real de la imagen (JPEG, PNG, WEBP o GIF) según su contenido, o None
+    si no es una imagen soportada. Solo lee la cabecera; no decodifica la imagen.
+    """
+    try:
+        with Image.open(source) as image:
+            image_format = image.format
+    except (UnidentifiedImageError, OSError):
+        return None
+    return image_format if image_format in ALLOWED_IMAGE_FORMATS else None
+
+
+def spool_image_upload(upload: UploadFile) -> Path:
+    """
+    Copia un UploadFile a un archivo temporal propio (que sobrevive al request;
+    el de Starlette se cierra al terminar) en bloques de 1 MB y comprueba que sea
+    una imagen. El tamaño del cuerpo ya lo limita UploadSizeLimitMiddleware antes
+    de leerlo; aquí se aplica el límite exacto a la imagen.
+    Quien lo reciba es responsable de borrarlo.
+    """
+    max_bytes = settings.max_image_upload_bytes
+    if upload.size is not None and upload.size > max_bytes:
+        raise HTTPException(status_code=413, detail="Imagen demasiado grande")
+
+    fd, tmp_path = tempfile.mkstemp(prefix="upload-", suffix=".img", dir=settings.upload_tmp_dir)
+    path = Path(tmp_path)
+    try:
+        written = 0
+        with os.fdopen(fd, "wb") as tmp:
+            upload.file.seek(0)
+            while chunk := upload.file.read(CHUNK_SIZE):
+                written += len(chunk)
+                if written > max_bytes:
+                    raise HTTPException(status_code=413, detail="Imagen demasiado grande")
+                tmp.write(chunk)
+
+        if sniff_image_format(path) is None:
+            raise HTTPException(status_code=415, detail="Formato de imagen no soportado")
+        return path
+    except BaseException:
+        path.unlink(missing_ok=True)
+        raise
@@ -1,21 +1,23 @@
 # backend/app/core/utils.py
-from passlib.context import CryptContext
-from cloudinary.uploader import upload
+import io
+from fastapi import HTTPException
+from PIL import Image
+from uuid import uuid4
+from app.core.storage import get_image_storage
+from app.core.uploads import sniff_image_format
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
-
-def verify_password(plain: str, hashed: str) -> bool:
-    return pwd_context.verify(plain, hashed)
-
-
-
-def upload_image_to_cloudinary(file):
+def upload_image(file):
     """
     file: archivo recibido de FastAPI UploadFile
-    Retorna: URL pública de la imagen
+    Retorna: URL pública de la imagen en el almacenamiento configurado
+    El tipo se deduce del contenido, no del content_type que declara el cliente.
     """
-    result = upload(file.file, folder="products")  # sube a carpeta 'products'
-    return result["secure_url"]
\ No newline at end of file
+    data = file.file.read()
+    image_format = sniff_image_format(io.BytesIO(data))
+    if image_format is None:
+        raise HTTPException(status_code=415, detail="Formato de imagen no soportado")
+    return get_image_storage().save(data, str(uuid4()), Image.MIME[image_format])
+
+
+# Nombre anterior, se conserva por compatibilidad
+upload_image_to_cloudinary = upload_image
\ No newline at end of file
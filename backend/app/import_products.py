@@ -0,0 +1,100 @@
+# backend/app/import_products.py
+"""
+Importación masiva de productos desde la línea de comandos.
+
+    python -m app.import_products catalogo.csv
+    python -m app.import_products catalogo.ndjson --chunk-size 1000
+"""
+import argparse
+import sys
+import time
+from collections import deque
+
+from app.core.database import SessionLocal, init_db
+from app.core.jobs import JOB_FAILED, job_queue
+from app.services.product_import_service import IMPORT_FORMATS, DEFAULT_CHUNK_SIZE, detect_format, import_products
+from app.services.product_service import enqueue_product_image
+
+
+class ImageBacklog:
+    """
+    Encola las imágenes en job_queue a medida que se confirma cada bloque.
+    Con max_pending trabajos sin terminar espera a que acabe el más antiguo:
+    en memoria nunca hay más de max_pending imágenes base64.
+    """
+
+    def __init__(self, max_pending: int, poll_interval: float = 0.05):
+        self.max_pending = max(1, max_pending)
+        self.poll_interval = poll_interval
+        self.pending = deque()
+        self.enqueued = 0
+        self.failed = []
+
+    def defer(self, product_id: str, image: str):
+        while len(self.pending) >= self.max_pending:
+            self._wait_oldest()
+        self.pending.append((product_id, enqueue_product_image(product_id, image)))
+        self.enqueued += 1
+
+    def drain(self):
+        while self.pending:
+            self._wait_oldest()
+
+    def _wait_oldest(self):
+        product_id, job = self.pending[0]
+        while not job.done:
+            time.sleep(self.poll_interval)
+        self.pending.popleft()
+        if job.status == JOB_FAILED:
+            self.failed.append((product_id, job.error))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Importa productos desde CSV o NDJSON")
+    parser.add_argument("path", help="Ruta del archivo a importar")
+    parser.add_argument("--format", choices=IMPORT_FORMATS, help="Por defecto se deduce de la extensión")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--skip-images", action="store_true", help="No procesar las imágenes base64")
+    args = parser.parse_args()
+
+    fmt = args.format or detect_format(args.path)
+    if fmt not in IMPORT_FORMATS:
+        parser.error("No se pudo deducir el formato; usa --format")
+
+    init_db()
+    images = None if args.skip_images else ImageBacklog(max_pending=args.chunk_size)
+    db = SessionLocal()
+    start = time.perf_counter()
+    try:
+        with open(args.path, "rb") as stream:
+            result = import_products(
+                db,
+                stream,
+                fmt,
+                chunk_size=args.chunk_size,
+                defer_image=images.defer if images else None,
+            )
+        if images:
+            images.drain()
+    finally:
+        db.close()
+        job_queue.shutdown(wait=True)
+    elapsed = time.perf_counter() - start
+
+    print(
+        f"Procesadas {result['processed']} filas en {elapsed:.1f}s: "
+        f"{result['inserted']} insertadas, {result['updated']} actualizadas, {result['failed']} con error"
+    )
+    for error in result["errors"]:
+        print(f"  fila {error['row']}: {error['error']}")
+
+    if images and images.enqueued:
+        print(f"Imágenes procesadas: {images.enqueued - len(images.failed)} de {images.enqueued}")
+        for product_id, error in images.failed:
+            print(f"  Error en la imagen del producto {product_id}: {error}")
+
+    return 1 if result["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,19 @@
 # app/main.py
-from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.routes import router as api_router
 from app.core.database import init_db
+from app.core.config import settings
+from app.core.http_client import payment_http_client
+from app.core.jobs import job_queue
+from app.core.rate_limit import RateLimitExceeded, retry_after_header
+from app.core.security import PasswordHasherBusy, password_hasher
+from app.core.http_cache import ImmutableStaticFiles
+from app.core.uploads import MULTIPART_OVERHEAD_BYTES, UploadSizeLimitMiddleware
+from app.services.cart_store import cart_store
+from app.services.image_variants import shutdown_encode_pool
 from pathlib import Path
 import os
 
@@ -15,7 +25,38 @@ origins = [
     "http://localhost:5173"  # para desarrollo local
 ] 
 
-app = FastAPI(title="E-Shop MVP Backend")
+# 🔹 Recursos que viven lo mismo que la app
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    job_queue.start()
+    cart_store.start()
+    await payment_http_client.start()
+    yield
+    await payment_http_client.aclose()
+    cart_store.shutdown()  # persiste los carritos pendientes (backend en memoria)
+    job_queue.shutdown(wait=True)
+    shutdown_encode_pool()
+    password_hasher.shutdown()
+
+app = FastAPI(title="E-Shop MVP Backend", lifespan=lifespan)
+
+# 🔹 Rate limit superado
+@app.exception_handler(RateLimitExceeded)
+async def rate_limit_exceeded_handler(request: Request, exc: RateLimitExceeded):
+    return JSONResponse(
+        status_code=429,
+        content={"detail": "Demasiados intentos, espera antes de reintentar"},
+        headers={"Retry-After": retry_after_header(exc.retry_after)},
+    )
+
+# 🔹 bcrypt saturado: mejor rechazar rápido que acumular logins en cola
+@app.exception_handler(PasswordHasherBusy)
+async def password_hasher_busy_handler(request: Request, exc: PasswordHasherBusy):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Servicio de autenticación saturado, reintenta en unos segundos"},
+        headers={"Retry-After": str(settings.password_hash_retry_after_seconds)},
+    )
 
 # 🔹 Crear tablas al iniciar la app
 init_db()
@@ -28,10 +69,19 @@ STATIC_DIR = BASE_DIR / "static"
 print(f"[DEBUG] STATIC_DIR = {STATIC_DIR}, exists: {STATIC_DIR.exists()}")
 
 if STATIC_DIR.exists():
-    app.mount("/static", StaticFiles(directory=str(STATIC_DIR)), name="static")
+    # static/cas/ (imágenes direccionadas por contenido) se sirve con caché inmutable
+    app.mount("/static", ImmutableStaticFiles(directory=str(STATIC_DIR)), name="static")
 else:
     raise RuntimeError(f"Directory '{STATIC_DIR}' does not exist")
 
+# 🔹 Subidas de imágenes: el límite se aplica mientras se recibe el cuerpo, no después.
+# Se registra antes que CORS para que CORS la envuelva y el 413 lleve sus cabeceras
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    path_pattern=r"^/products/(upload|[^/]+/image)$",
+    max_body_bytes=settings.max_image_upload_bytes + MULTIPART_OVERHEAD_BYTES,
+)
+
 # 🔹 Configuración CORS
 app.add_middleware(
     CORSMiddleware,
@@ -1,63 +1,237 @@
-# backend/migrate_images_to_cloudinary.py
+# backend/app/migrate_images_to_cloudinary.py
+"""
+Migra las imágenes locales (static/products/<uuid>_<tamaño>.webp) a Cloudinary.
+
+    python -m app.migrate_images_to_cloudinary
+    python -m app.migrate_images_to_cloudinary --workers 16
+    python -m app.migrate_images_to_cloudinary --dry-run
+
+Las subidas van en paralelo con un número acotado de productos en vuelo.
+Cada producto se actualiza con un solo UPDATE de sus tres columnas de imagen y
+queda anotado en un archivo de checkpoint: si el proceso se interrumpe, la
+siguiente ejecución retoma donde se quedó. Los public_id son estables
+(<uuid>_<tamaño>), así que volver a subir un archivo no crea duplicados.
+"""
+import argparse
+import json
 import os
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from pathlib import Path
-import cloudinary
-import cloudinary.uploader
-from dotenv import load_dotenv
+from typing import Dict, Iterable, List, Set, Tuple
+from uuid import UUID
 
-# Importar modelos y DB desde app
 from app.core.database import SessionLocal
-from app.models import Product  # ajusta según tu modelo real
+from app.core.storage import STATIC_DIR, CloudinaryStorage
+from app.models.product import Product
+from app.services.image_variants import IMAGE_SIZES
+
+IMAGES_PATH = STATIC_DIR / "products"
+DEFAULT_CHECKPOINT = IMAGES_PATH / ".cloudinary_migration.json"
+
+# Tamaño -> columna de Product
+SIZE_COLUMNS = {size_name: f"image_{size_name}" for size_name in IMAGE_SIZES}
+
+
+def find_product_images(images_path: Path) -> Dict[str, Dict[str, Path]]:
+    """Agrupa los archivos por producto: {uuid: {tamaño: ruta}}."""
+    grouped: Dict[str, Dict[str, Path]] = defaultdict(dict)
+    for file_path in sorted(images_path.glob("*.webp")):
+        product_id, _, size_name = file_path.stem.rpartition("_")
+        if size_name not in SIZE_COLUMNS:
+            continue
+        try:
+            product_id = str(UUID(product_id))
+        except ValueError:
+            continue
+        grouped[product_id][size_name] = file_path
+    return dict(grouped)
+
+
+class Checkpoint:
+    """Conjunto de productos ya migrados, persistido en JSON con escritura atómica."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.done: Set[str] = set()
+        if self.path.exists():
+            with open(self.path, encoding="utf-8") as f:
+                self.done = set(json.load(f).get("done", []))
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.path.parent, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as tmp:
+            json.dump({"done": sorted(self.done)}, tmp)
+        os.replace(tmp_path, self.path)
+
 
-# Cargar variables de entorno
-load_dotenv()
+class Progress:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.start = time.perf_counter()
+        self.products = 0
+        self.files = 0
+        self.bytes = 0
+        self.failed = 0
 
-cloudinary.config(
-    cloud_name=os.getenv("CLOUDINARY_CLOUD_NAME"),
-    api_key=os.getenv("CLOUDINARY_API_KEY"),
-    api_secret=os.getenv("CLOUDINARY_API_SECRET"),
-)
+    def add(self, files: int, size: int):
+        with self._lock:
+            self.products += 1
+            self.files += files
+            self.bytes += size
 
-# Subiendo un nivel desde __file__ para llegar a backend/
-IMAGES_PATH = Path(__file__).parent.parent / "static" / "products"
+    def summary(self) -> str:
+        elapsed = max(time.perf_counter() - self.start, 1e-9)
+        return (
+            f"{self.products} productos, {self.files} archivos, {self.bytes / 1024 / 1024:.1f} MB "
+            f"en {elapsed:.1f}s ({self.files / elapsed:.1f} archivos/s, "
+            f"{self.bytes / 1024 / 1024 / elapsed:.2f} MB/s), {self.failed} con error"
+        )
 
 
-def migrate_images():
-    print(f"Buscando imágenes en {IMAGES_PATH}...")
+def upload_product(storage, product_id: str, files: Dict[str, Path], dry_run: bool) -> Tuple[Dict[str, str], int]:
+    """Sube los tamaños de un producto; devuelve ({tamaño: url}, bytes leídos)."""
+    urls = {}
+    total = 0
+    for size_name, file_path in files.items():
+        data = file_path.read_bytes()
+        total += len(data)
+        if dry_run:
+            urls[size_name] = f"(dry-run) {file_path.name}"
+        else:
+            urls[size_name] = storage.save(data, f"{product_id}_{size_name}", "image/webp")
+    return urls, total
 
-    image_files = list(IMAGES_PATH.glob("*.webp"))
-    print(f"Archivos encontrados: {image_files}")
 
+def existing_product_ids(product_ids: List[str], batch_size: int = 500) -> Set[str]:
+    """Ids que existen en la base (consultas IN por bloques)."""
+    found: Set[str] = set()
     db = SessionLocal()
+    try:
+        for i in range(0, len(product_ids), batch_size):
+            batch = [UUID(product_id) for product_id in product_ids[i:i + batch_size]]
+            found.update(str(row.id) for row in db.query(Product.id).filter(Product.id.in_(batch)))
+    finally:
+        db.close()
+    return found
 
-    for file_path in image_files:
-        filename = file_path.stem  # elimina extensión
-        product_uuid = filename.split("_")[0]  # si tu archivo tiene formato uuid_size
 
-        product = db.query(Product).filter(Product.uuid == product_uuid).first()
-        if not product:
-            print(f"Producto con UUID {product_uuid} no encontrado en DB, saltando...")
-            continue
+def apply_urls(db, product_id: str, urls: Dict[str, str]):
+    """Un solo UPDATE por producto con todas sus columnas de imagen."""
+    values = {SIZE_COLUMNS[size_name]: url for size_name, url in urls.items()}
+    db.query(Product).filter(Product.id == UUID(product_id)).update(values, synchronize_session=False)
 
-        size = "original"
-        if "_small" in filename:
-            size = "small"
-        elif "_medium" in filename:
-            size = "medium"
-        elif "_thumbnail" in filename:
-            size = "thumbnail"
 
-        try:
-            upload_result = cloudinary.uploader.upload(str(file_path), folder="products")
-            url = upload_result.get("secure_url")
-            setattr(product, f"url_{size}", url)
+def migrate_images(
+    images_path: Path = IMAGES_PATH,
+    checkpoint_path: Path = DEFAULT_CHECKPOINT,
+    workers: int = 8,
+    commit_every: int = 50,
+    dry_run: bool = False,
+    limit: int = 0,
+) -> Progress:
+    print(f"Buscando imágenes en {images_path}...")
+    grouped = find_product_images(images_path)
+    checkpoint = Checkpoint(checkpoint_path)
+
+    pending_ids = [product_id for product_id in grouped if product_id not in checkpoint.done]
+    known = existing_product_ids(pending_ids)
+    missing = [product_id for product_id in pending_ids if product_id not in known]
+    pending_ids = [product_id for product_id in pending_ids if product_id in known]
+    if limit:
+        pending_ids = pending_ids[:limit]
+
+    print(
+        f"{len(grouped)} productos con imágenes: {len(checkpoint.done & grouped.keys())} ya migrados, "
+        f"{len(missing)} sin producto en la base, {len(pending_ids)} pendientes"
+    )
+
+    storage = None if dry_run else CloudinaryStorage()
+    progress = Progress()
+    db = None if dry_run else SessionLocal()
+    uncommitted: List[str] = []
+
+    def flush():
+        if db is not None and uncommitted:
             db.commit()
-            print(f"Producto {product_uuid} actualizado con URL de Cloudinary ({size}) ✅")
-        except Exception as e:
-            print(f"Error subiendo {file_path.name}: {e}")
+            checkpoint.done.update(uncommitted)
+            checkpoint.save()
+        uncommitted.clear()
+
+    def submit_all(executor) -> Iterable:
+        # Como mucho 2 productos por hilo en vuelo: la memoria no crece con el catálogo
+        in_flight = {}
+        ids = iter(pending_ids)
+        while True:
+            while len(in_flight) < workers * 2:
+                product_id = next(ids, None)
+                if product_id is None:
+                    break
+                future = executor.submit(upload_product, storage, product_id, grouped[product_id], dry_run)
+                in_flight[future] = product_id
+            if not in_flight:
+                return
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                yield in_flight.pop(future), future
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for product_id, future in submit_all(executor):
+                try:
+                    urls, size = future.result()
+                except Exception as e:
+                    progress.failed += 1
+                    print(f"Error subiendo las imágenes de {product_id}: {e}")
+                    continue
+
+                progress.add(len(urls), size)
+                if db is not None:
+                    apply_urls(db, product_id, urls)
+                    uncommitted.append(product_id)
+                    if len(uncommitted) >= commit_every:
+                        flush()
+                if progress.products % 100 == 0:
+                    print(f"  {progress.summary()}")
+        flush()
+    finally:
+        if db is not None:
+            db.close()
+
+    if dry_run:
+        print("Dry-run: no se subió nada ni se modificó la base")
+    print(f"Migración completada ✅ {progress.summary()}")
+    return progress
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migra las imágenes locales de productos a Cloudinary")
+    parser.add_argument("--images-path", type=Path, default=IMAGES_PATH)
+    parser.add_argument("--checkpoint", type=Path, default=DEFAULT_CHECKPOINT, help="Archivo de progreso para reanudar")
+    parser.add_argument("--workers", type=int, default=8, help="Subidas concurrentes")
+    parser.add_argument("--commit-every", type=int, default=50, help="Productos por commit/checkpoint")
+    parser.add_argument("--limit", type=int, default=0, help="Migrar como mucho N productos (0 = todos)")
+    parser.add_argument("--dry-run", action="store_true", help="Solo lee los archivos y mide el rendimiento")
+    parser.add_argument("--reset", action="store_true", help="Ignorar el checkpoint y empezar de cero")
+    args = parser.parse_args()
+
+    if args.reset and args.checkpoint.exists():
+        args.checkpoint.unlink()
+
+    progress = migrate_images(
+        images_path=args.images_path,
+        checkpoint_path=args.checkpoint,
+        workers=max(1, args.workers),
+        commit_every=max(1, args.commit_every),
+        dry_run=args.dry_run,
+        limit=args.limit,
+    )
+    raise SystemExit(1 if progress.failed else 0)
 
-    db.close()
-    print("Migración completada ✅")
 
 if __name__ == "__main__":
-    migrate_images()
+    main()
@@ -1,4 +1,5 @@
 from .user import User
 from .payment import Payment
 from .product import Product
-from .cart import CartItem
\ No newline at end of file
+from .cart import Cart, CartItem
+from .idempotency_key import IdempotencyKey
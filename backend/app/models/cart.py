@@ -1,10 +1,42 @@
 # app/models/cart_item_model.py
-from sqlalchemy import Column, Integer, ForeignKey
+from sqlalchemy import Column, DateTime, Float, Integer, ForeignKey, Index, func, select, tuple_
 from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import UUID as PG_UUID
 from app.core.database import Base
+from app.core.time_utils import utc_now
 import uuid
 
+
+def merge_duplicate_cart_items(connection):
+    """
+    Une las filas repetidas (mismo usuario y producto) sumando sus cantidades,
+    para poder crear el índice único en bases que ya tienen duplicados.
+    """
+    table = CartItem.__table__
+    duplicated = (
+        select(table.c.user_uuid, table.c.product_id)
+        .group_by(table.c.user_uuid, table.c.product_id)
+        .having(func.count() > 1)
+    )
+    rows = connection.execute(
+        select(table.c.cart_item_uuid, table.c.user_uuid, table.c.product_id, table.c.quantity)
+        .where(tuple_(table.c.user_uuid, table.c.product_id).in_(duplicated))
+        .order_by(table.c.user_uuid, table.c.product_id)
+    ).all()
+
+    groups = {}
+    for row in rows:
+        groups.setdefault((row.user_uuid, row.product_id), []).append(row)
+    for keeper, *duplicates in groups.values():
+        total = keeper.quantity + sum(row.quantity for row in duplicates)
+        connection.execute(
+            table.update().where(table.c.cart_item_uuid == keeper.cart_item_uuid).values(quantity=total)
+        )
+        connection.execute(
+            table.delete().where(table.c.cart_item_uuid.in_([row.cart_item_uuid for row in duplicates]))
+        )
+
+
 class CartItem(Base):
     __tablename__ = "cart_items"
 
@@ -14,4 +46,29 @@ class CartItem(Base):
     quantity = Column(Integer, nullable=False)
 
     user = relationship("User", back_populates="cart_items")
-    product = relationship("Product", back_populates="cart_items")
\ No newline at end of file
+    product = relationship("Product", back_populates="cart_items")
+
+    # Una fila por (usuario, producto): permite el upsert atómico de /cart/add
+    __table_args__ = (
+        Index(
+            "ux_cart_items_user_product",
+            "user_uuid",
+            "product_id",
+            unique=True,
+            info={"before_create": merge_duplicate_cart_items},
+        ),
+    )
+
+
+class Cart(Base):
+    """
+    Cabecera del carrito: número de líneas y subtotal ya calculados.
+    Cada cambio en cart_items y cada cambio de precio la actualiza con un delta
+    (ver app/services/cart_summary.py); leer el total es una búsqueda por clave.
+    """
+    __tablename__ = "carts"
+
+    user_uuid = Column(PG_UUID(as_uuid=True), ForeignKey("users.user_uuid"), primary_key=True)
+    item_count = Column(Integer, nullable=False, default=0)
+    subtotal = Column(Float, nullable=False, default=0.0)
+    updated_at = Column(DateTime(timezone=True), default=utc_now, onupdate=utc_now, nullable=False)
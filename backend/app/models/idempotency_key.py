@@ -0,0 +1,22 @@
+# app/models/idempotency_key.py
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, String, Text
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID
+from app.core.database import Base
+from app.core.time_utils import utc_now
+
+
+class IdempotencyKey(Base):
+    """
+    Idempotency-Key recibida en un endpoint (por usuario): huella de la petición
+    y, cuando termina, la respuesta que se devuelve a los reintentos.
+    """
+    __tablename__ = "idempotency_keys"
+
+    user_uuid = Column(PG_UUID(as_uuid=True), ForeignKey("users.user_uuid"), primary_key=True)
+    key = Column(String(255), primary_key=True)
+    request_fingerprint = Column(String(64), nullable=False)
+    status = Column(String(20), nullable=False, default="in_progress")  # in_progress | started | completed
+    response_status = Column(Integer, nullable=True)
+    response_body = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), default=utc_now, nullable=False, index=True)
+    completed_at = Column(DateTime(timezone=True), nullable=True)
@@ -1,9 +1,30 @@
-from sqlalchemy import Column, String, Float, Text, Boolean, Integer
+from sqlalchemy import Column, String, Float, Text, Boolean, Integer, DateTime, Index, func, literal_column
 from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import UUID as PG_UUID
+import sqlalchemy.dialects.postgresql  # registra to_tsvector/ts_rank con sus tipos
 from app.core.database import Base
+from app.core.time_utils import utc_now
 import uuid
 
+SEARCH_CONFIG = literal_column("'simple'")
+
+
+def product_search_vector(name_column, description_column):
+    """
+    tsvector ponderado (nombre 'A', descripción 'B').
+    La misma expresión define el índice GIN y las búsquedas, para que PostgreSQL lo use.
+    """
+    name_vector = func.setweight(
+        func.to_tsvector(SEARCH_CONFIG, func.coalesce(name_column, literal_column("''"))),
+        literal_column("'A'"),
+    )
+    description_vector = func.setweight(
+        func.to_tsvector(SEARCH_CONFIG, func.coalesce(description_column, literal_column("''"))),
+        literal_column("'B'"),
+    )
+    return name_vector.op("||")(description_vector)
+
+
 class Product(Base):
     __tablename__ = "products"
 
@@ -16,6 +37,29 @@ class Product(Base):
     image_small = Column(String(255), nullable=True)
     image_medium = Column(String(255), nullable=True)
     image_thumbnail = Column(String(255), nullable=True)
+    # Original normalizado (WebP hasta 2048px) para generar tamaños a demanda
+    image_master = Column(String(255), nullable=True)
+
+    # Versión de la fila: se incrementa en cada UPDATE (ORM o Core) y alimenta los ETag
+    version = Column(Integer, nullable=False, default=1, server_default="1", onupdate=literal_column("version + 1"))
+    updated_at = Column(DateTime(timezone=True), nullable=True, default=utc_now, onupdate=utc_now, index=True)
 
     # Relaciones
     cart_items = relationship("CartItem", back_populates="product", cascade="all, delete-orphan")
+
+    # Índices para la paginación por cursor (orden + desempate por id)
+    __table_args__ = (
+        Index("ix_products_active_name_id", "is_active", "name", "id"),
+        Index("ix_products_active_price_id", "is_active", "price", "id"),
+        Index(
+            "ix_products_name_prefix",
+            func.lower(name).label("name_lower"),
+            postgresql_ops={"name_lower": "text_pattern_ops"},
+        ),
+        # Búsqueda de texto completo (solo PostgreSQL; en SQLite se usa el índice en memoria)
+        Index(
+            "ix_products_search",
+            product_search_vector(name, description),
+            postgresql_using="gin",
+        ).ddl_if(dialect="postgresql"),
+    )
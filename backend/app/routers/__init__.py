@@ -4,4 +4,7 @@ from .cart_router import router as cart_router
 from .product_router import router as product_router
 from .payment_router import router as payment_router
 from .checkout_router import router as checkout_router
-from .payment_attempt_router import router as payment_attempt_router
\ No newline at end of file
+from .payment_attempt_router import router as payment_attempt_router
+from .metrics_router import router as metrics_router
+from .jobs_router import router as jobs_router
+from .image_router import router as image_router
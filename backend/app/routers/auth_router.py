@@ -1,21 +1,40 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from app.schemas.user_schema import UserCreate, UserOut, UserLogin , TokenResponse
 from app.models.user import User
 from app.core.database import get_db
-from app.core.security import get_password_hash, verify_password, create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
+from app.core.rate_limit import LOGIN_PER_EMAIL, LOGIN_PER_IP, REGISTER_PER_IP, client_ip, rate_limiter
+from app.core.security import get_password_hash_async, verify_password_async, create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
 from datetime import timedelta
 from pydantic import BaseModel 
 
 router = APIRouter(prefix="/auth", tags=["Auth"])
 
+def _get_user_by_email(db: Session, email: str):
+    return db.query(User).filter(User.email == email).first()
+
+
+def _save_user(db: Session, user: User) -> User:
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    return user
+
+
+# Endpoints async: bcrypt corre en su propio executor acotado (503 si está saturado)
+# y el acceso a la base, en el threadpool, para no bloquear el event loop.
+
 # -------------------------------
 # Register
 # -------------------------------
 @router.post("/register", response_model=UserOut)
-def register(payload: UserCreate, db: Session = Depends(get_db)):
+async def register(payload: UserCreate, request: Request, db: Session = Depends(get_db)):
+    # Límites antes de tocar la base o bcrypt (429 si se superan)
+    rate_limiter.hit(REGISTER_PER_IP, client_ip(request))
+
     # Verifica si el usuario ya existe
-    existing_user = db.query(User).filter(User.email == payload.email).first()
+    existing_user = await run_in_threadpool(_get_user_by_email, db, payload.email)
     if existing_user:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Email ya registrado")
 
@@ -23,24 +42,24 @@ def register(payload: UserCreate, db: Session = Depends(get_db)):
     new_user = User(
         email=payload.email,
         full_name=payload.full_name,
-        hashed_password=get_password_hash(payload.password),
+        hashed_password=await get_password_hash_async(payload.password),
         is_admin=payload.is_admin
     )
-
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
-    return new_user
+    return await run_in_threadpool(_save_user, db, new_user)
 
 
 # -------------------------------
 # Login
 # -------------------------------
 @router.post("/login", response_model=TokenResponse)
-def login(payload: UserLogin, db: Session = Depends(get_db)):
+async def login(payload: UserLogin, request: Request, db: Session = Depends(get_db)):
+    # Límites antes de tocar la base o bcrypt (429 si se superan)
+    rate_limiter.hit(LOGIN_PER_IP, client_ip(request))
+    rate_limiter.hit(LOGIN_PER_EMAIL, payload.email.lower())
+
     # Buscar usuario
-    user = db.query(User).filter(User.email == payload.email).first()
-    if not user or not verify_password(payload.password, user.hashed_password):
+    user = await run_in_threadpool(_get_user_by_email, db, payload.email)
+    if not user or not await verify_password_async(payload.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Credenciales incorrectas"
@@ -51,7 +70,9 @@ def login(payload: UserLogin, db: Session = Depends(get_db)):
     access_token = create_access_token(
         data={
             "sub": user.email,       # 👈 email como identificador
-            "is_admin": user.is_admin  # 👈 incluir rol admin
+            "is_admin": user.is_admin,  # 👈 incluir rol admin
+            "user_uuid": str(user.user_uuid),  # 👈 permite autenticar sin consultar la base
+            "name": user.full_name
         },
         expires_delta=access_token_expires
     )
@@ -1,14 +1,57 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from uuid import UUID
 from sqlalchemy.orm import Session
 from app.core.database import get_db
-from app.core.dependencies import get_current_user
+from app.core.dependencies import get_current_admin_user, get_current_user
 from app.models.user import User
 from app.models.product import Product
-from app.models.cart import CartItem
-from app.schemas.cart_schema import CartItemCreate, CartItemDetail, CartItemResponse
+from app.schemas.cart_schema import CartBatchRequest, CartItemCreate, CartItemDetail, CartItemResponse, CartSummaryResponse
+from app.services.cart_service import (
+    add_to_cart,
+    apply_cart_batch,
+    cart_line_to_dict,
+    clear_cart,
+    enqueue_cart_summary_repair,
+    get_cart_line,
+    get_cart_lines,
+    get_cart_summary,
+    get_cart_totals,
+    remove_cart_item,
+    update_cart_item_quantity,
+)
 
 router = APIRouter(prefix="/cart", tags=["Cart"])
 
+# -------------------------------------
+# 🔹 Carrito completo: items + totales
+# -------------------------------------
+@router.get("", response_model=CartSummaryResponse)
+def get_cart_endpoint(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Items y totales en una sola llamada (y una sola consulta),
+    en lugar de /cart/list + /cart/total.
+    """
+    return get_cart_summary(db, current_user.user_uuid)
+
+# -------------------------------------
+# 🔹 Aplicar varios cambios de una vez
+# -------------------------------------
+@router.post("/batch", response_model=CartSummaryResponse)
+def cart_batch_endpoint(
+    batch: CartBatchRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Aplica una lista de operaciones add/set/remove en una sola transacción
+    (todo o nada) y devuelve el carrito resultante. Pensado para sincronizar
+    el carrito local del frontend con una sola petición.
+    """
+    return apply_cart_batch(db, current_user.user_uuid, batch.operations)
+
 # -------------------------------------
 # 🔹 Agregar producto al carrito
 # -------------------------------------
@@ -22,33 +65,17 @@ def add_to_cart_endpoint(
     product = db.query(Product).filter(Product.id == item.product_id).first()
     if not product:
         raise HTTPException(status_code=404, detail="Producto no encontrado")
-    
-    # Buscar item existente en carrito
-    cart_item = db.query(CartItem).filter(
-        CartItem.user_uuid == current_user.user_uuid,
-        CartItem.product_id == product.id
-    ).first()
-    
-    if cart_item:
-        cart_item.quantity += item.quantity
-    else:
-        cart_item = CartItem(
-            user_uuid=current_user.user_uuid,
-            product_id=product.id,
-            quantity=item.quantity
-        )
-        db.add(cart_item)
-    
-    db.commit()
-    db.refresh(cart_item)
-    
+
+    # Alta o incremento en una sola sentencia (sin SELECT previo ni refresh)
+    line = add_to_cart(db, current_user.user_uuid, product.id, item.quantity)
+
     return CartItemDetail(
-        id=str(cart_item.cart_item_uuid),                  # ✅ Convertido
+        id=str(line.cart_item_uuid),                       # ✅ Convertido
         product_id=str(product.id),                        # ✅ Nombre correcto
         product_name=product.name,
-        quantity=cart_item.quantity,
+        quantity=line.quantity,
         price=product.price,
-        total_price=product.price * cart_item.quantity,
+        total_price=product.price * line.quantity,
         image_url=getattr(product, "image_thumbnail", None)  # ✅ Se incluye
     )
 
@@ -60,33 +87,19 @@ def list_cart_items_endpoint(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
-    items = db.query(CartItem).filter(CartItem.user_uuid == current_user.user_uuid).all()
-    return [
-        {
-            "product_id": str(item.product_id),
-            "name": item.product.name,
-            "price": item.product.price,
-            "quantity": item.quantity,
-            "subtotal": item.product.price * item.quantity,
-            "image_url": getattr(item.product, "image_thumbnail", None),
-        }
-        for item in items
-    ]
+    return [cart_line_to_dict(item, product) for item, product in get_cart_lines(db, current_user.user_uuid)]
 
 # -------------------------------------
 # 🔹 Actualizar cantidad
 # -------------------------------------
 @router.put("/update/{product_id}", response_model=dict)
 def update_cart_item_quantity_endpoint(
-    product_id: str,
+    product_id: UUID,
     quantity: int,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
-    item = db.query(CartItem).filter(
-        CartItem.user_uuid == current_user.user_uuid,
-        CartItem.product_id == product_id
-    ).first()
+    item = get_cart_line(db, current_user.user_uuid, product_id)
 
     if not item:
         raise HTTPException(status_code=404, detail="El producto no está en el carrito")
@@ -98,8 +111,7 @@ def update_cart_item_quantity_endpoint(
     if product.stock < quantity:
         raise HTTPException(status_code=400, detail="Stock insuficiente")
 
-    item.quantity = quantity
-    db.commit()
+    update_cart_item_quantity(db, current_user.user_uuid, product_id, quantity)
     return {"message": "Cantidad actualizada correctamente"}
 
 # -------------------------------------
@@ -107,20 +119,16 @@ def update_cart_item_quantity_endpoint(
 # -------------------------------------
 @router.delete("/remove/{product_id}", response_model=dict)
 def remove_cart_item_endpoint(
-    product_id: str,
+    product_id: UUID,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
-    item = db.query(CartItem).filter(
-        CartItem.user_uuid == current_user.user_uuid,
-        CartItem.product_id == product_id
-    ).first()
+    item = get_cart_line(db, current_user.user_uuid, product_id)
     
     if not item:
         raise HTTPException(status_code=404, detail="El producto no está en el carrito")
     
-    db.delete(item)
-    db.commit()
+    remove_cart_item(db, current_user.user_uuid, product_id)
     
     return {"message": "Producto eliminado del carrito"}
 
@@ -134,11 +142,7 @@ def clear_cart_endpoint(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
-    deleted = db.query(CartItem).filter(
-        CartItem.user_uuid == current_user.user_uuid
-    ).delete()
-
-    db.commit()
+    deleted = clear_cart(current_user.user_uuid, db)
     return {"message": f"Se eliminaron {deleted} productos del carrito."}
 
 
@@ -150,13 +154,19 @@ def cart_total_endpoint(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
-    items = db.query(CartItem).filter(
-        CartItem.user_uuid == current_user.user_uuid
-    ).all()
-
-    total = sum(item.product.price * item.quantity for item in items)
+    return get_cart_totals(db, current_user.user_uuid)
 
-    return {
-        "total": total,
-        "cantidad_items": len(items)
-    }
\ No newline at end of file
+# -------------------------------------
+# 🔒 Solo admin: Verificar y reparar los totales guardados
+# -------------------------------------
+@router.post("/summaries/repair", response_model=dict, status_code=202)
+def repair_cart_summaries_endpoint(
+    dry_run: bool = Query(False, description="Solo informar de las diferencias, sin corregirlas"),
+    current_admin=Depends(get_current_admin_user),
+):
+    """
+    Recalcula cada carrito desde cart_items y corrige las filas de carts que no
+    coinciden. Se ejecuta en segundo plano; el resultado queda en /jobs/{job_id}.
+    """
+    job = enqueue_cart_summary_repair(dry_run)
+    return {"job_id": job.id, "status": job.status}
@@ -1,9 +1,11 @@
-from fastapi import APIRouter, Depends
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, Request, Response
 from sqlalchemy.orm import Session
 from app.schemas.payment_schema import PaymentRequest, PaymentResponse
-from app.services.checkout_service import process_checkout
+from app.services.checkout_service import process_checkout_once
 from app.core.database import get_db
 from app.core.dependencies import get_current_user
+from app.core.timing import server_timing_header
 from app.models.user import User
 
 router = APIRouter(
@@ -12,13 +14,22 @@ router = APIRouter(
 )
 
 @router.post("/payment", response_model=PaymentResponse)
-def checkout_payment(
+async def checkout_payment(
     payment_data: PaymentRequest,
+    request: Request,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
     Endpoint para procesar el pago del carrito usando Mock Payment.
+    Con Idempotency-Key, los reintentos reciben la respuesta de la primera
+    ejecución sin volver a cobrar. La duración de cada etapa va en la cabecera Server-Timing.
     """
-    result = process_checkout(current_user, payment_data.model_dump(), db)
+    timings = {}
+    result = await process_checkout_once(
+        current_user, payment_data.model_dump(), db, idempotency_key, request.url.path, timings=timings
+    )
+    response.headers["Server-Timing"] = server_timing_header(timings)
     return result
@@ -0,0 +1,48 @@
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import Response
+from sqlalchemy.orm import Session
+from uuid import UUID
+import requests
+
+from app.core.config import settings
+from app.core.database import get_db
+from app.core.http_cache import is_not_modified, not_modified_response
+from app.services.image_resize_service import render_image_variant, resolve_image_variant
+
+router = APIRouter(prefix="/images", tags=["Images"])
+
+MIN_DIMENSION = 16
+
+# -------------------------
+# 🔹 Público: Imagen de producto a cualquier tamaño
+# -------------------------
+@router.get("/{product_id}/{width:int}x{height:int}.webp")
+def get_product_image(
+    product_id: UUID,
+    width: int,
+    height: int,
+    request: Request,
+    db: Session = Depends(get_db),
+):
+    """
+    Devuelve la imagen del producto ajustada a width x height (sin ampliarla) en WebP.
+    Se genera la primera vez a partir del master y queda en una cache LRU en disco.
+    """
+    max_dimension = settings.image_variant_max_dimension
+    if not (MIN_DIMENSION <= width <= max_dimension and MIN_DIMENSION <= height <= max_dimension):
+        raise HTTPException(status_code=400, detail=f"Las dimensiones deben estar entre {MIN_DIMENSION} y {max_dimension}")
+
+    variant = resolve_image_variant(db, product_id, width, height)
+    if variant is None:
+        raise HTTPException(status_code=404, detail="Imagen no encontrada")
+
+    # El ETag no depende de los bytes: un cliente con la variante no provoca descarga ni redimensionado
+    cache_control = settings.image_variant_cache_control
+    if is_not_modified(request, variant.etag, None):
+        return not_modified_response(variant.etag, None, cache_control)
+
+    try:
+        data = render_image_variant(variant, width, height)
+    except (OSError, requests.RequestException) as e:
+        raise HTTPException(status_code=502, detail=f"No se pudo obtener la imagen original: {e}")
+    return Response(content=data, media_type="image/webp", headers={"ETag": variant.etag, "Cache-Control": cache_control})
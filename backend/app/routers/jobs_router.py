@@ -0,0 +1,32 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import List
+from app.core.dependencies import get_current_admin_user
+from app.core.jobs import job_queue
+
+router = APIRouter(prefix="/jobs", tags=["Jobs"])
+
+# -------------------------
+# 🔒 Solo admin: Trabajos recientes
+# -------------------------
+@router.get("/", response_model=List[dict])
+def list_jobs(
+    limit: int = Query(50, ge=1, le=500),
+    current_admin=Depends(get_current_admin_user)
+):
+    """
+    Lista los últimos trabajos en segundo plano de este worker.
+    """
+    return [job.to_dict() for job in job_queue.recent(limit)]
+
+# -------------------------
+# 🔒 Solo admin: Estado de un trabajo
+# -------------------------
+@router.get("/{job_id}", response_model=dict)
+def get_job(job_id: str, current_admin=Depends(get_current_admin_user)):
+    """
+    Devuelve el estado de un trabajo (queued, running, retrying, succeeded, failed).
+    """
+    job = job_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    return job.to_dict()
@@ -0,0 +1,37 @@
+from fastapi import APIRouter, Depends
+from app.core.dependencies import get_current_admin_user, principal_cache
+from app.core.http_client import payment_http_client
+from app.core.jobs import job_queue
+from app.core.rate_limit import rate_limiter
+from app.core.security import password_hasher, token_cache
+from app.core.storage import get_image_storage
+from app.services.cart_store import cart_store
+from app.services.checkout_service import checkout_timings
+from app.services.idempotency_service import idempotency_store
+from app.services.image_resize_service import get_variant_cache
+from app.services.product_service import catalog_cache
+
+router = APIRouter(prefix="/metrics", tags=["Metrics"])
+
+# -------------------------
+# 🔒 Solo admin: Métricas internas del proceso
+# -------------------------
+@router.get("/", response_model=dict)
+def get_metrics(current_admin=Depends(get_current_admin_user)):
+    """
+    Devuelve contadores en memoria de este worker (caches, colas, etc.).
+    """
+    return {
+        "catalog_cache": catalog_cache.stats(),
+        "jobs": job_queue.stats(),
+        "image_storage": get_image_storage().stats(),
+        "image_variant_cache": get_variant_cache().stats(),
+        "password_hashing": password_hasher.stats(),
+        "auth_principal_cache": principal_cache.stats(),
+        "auth_token_cache": token_cache.stats(),
+        "rate_limit": rate_limiter.stats(),
+        "cart_store": cart_store.stats(),
+        "payment_http_client": payment_http_client.stats(),
+        "checkout_stages": checkout_timings.stats(),
+        "idempotency": idempotency_store.stats(),
+    }
@@ -1,10 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from app.core.database import get_db
 from app.core.dependencies import get_current_user
+from app.core.timing import server_timing_header
 from app.models.user import User
-from app.services.checkout_service import process_checkout
+from app.services.checkout_service import process_checkout_once
 
 router = APIRouter(prefix="/payments", tags=["Payments"])
 
@@ -15,7 +17,14 @@ class CheckoutRequest(BaseModel):
     cvv: str
 
 @router.post("/checkout")
-def checkout(payload: CheckoutRequest, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def checkout(
+    payload: CheckoutRequest,
+    request: Request,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
 
     if not current_user.user_uuid:
         raise HTTPException(status_code=400, detail="Usuario no tiene cuenta vinculada")
@@ -28,11 +37,16 @@ def checkout(payload: CheckoutRequest, db: Session = Depends(get_db), current_us
         "cvv": payload.cvv
     }
 
-    # ✅ Enviar todo al servicio centralizado
-    result = process_checkout(
+    # ✅ Enviar todo al servicio centralizado (con Idempotency-Key, una sola vez por clave)
+    timings = {}
+    result = await process_checkout_once(
         user=current_user,
         card_data=card_data,
-        db=db
+        db=db,
+        idempotency_key=idempotency_key,
+        path=request.url.path,
+        timings=timings
     )
+    response.headers["Server-Timing"] = server_timing_header(timings)
 
     return result
@@ -1,49 +1,160 @@
-from fastapi import APIRouter, Depends, HTTPException, Path
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Path, Query, Request, Response, UploadFile
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
+from datetime import datetime
+from typing import List, Literal, Optional
 from app.core.database import get_db
 from app.models.product import Product
+from app.core.config import settings
+from app.core.http_cache import is_not_modified, not_modified_response, set_cache_headers
+from app.core.uploads import spool_image_upload
 
-from app.schemas.product_schema import ProductCreate, ProductUpdate, ProductResponse
+from app.schemas.product_schema import ProductCreate, ProductUpdate, ProductResponse, ProductWithJobResponse, ProductImportResult
 
 from app.services.product_service import (
     create_product,
-    get_all_products,
+    get_catalog_json,
+    get_catalog_etag,
+    get_product_json,
+    get_product_etag,
     get_product_by_id,
     update_product,
-    delete_product
+    delete_product,
+    enqueue_product_image,
+    replace_product_image
 )
+from app.services.product_import_service import IMPORT_FORMATS, detect_format, import_products
+from app.services.search_service import get_search_json
+from app.services.product_export_service import EXPORT_MEDIA_TYPES, iter_product_export
+from app.core.time_utils import utc_now
 from app.core.dependencies import get_current_admin_user
 
 router = APIRouter(prefix="/products", tags=["Products"])
 
+
+def _with_image_job(product: Product, image_job_id: Optional[str]) -> ProductWithJobResponse:
+    """Respuesta de creación/actualización con el trabajo de imagen pendiente (si hay)."""
+    response = ProductWithJobResponse.model_validate(product, from_attributes=True)
+    response.image_job_id = image_job_id
+    return response
+
 # -------------------------
 # 🔹 Público: Listar productos
 # -------------------------
 @router.get("/", response_model=List[ProductResponse])
-def list_products(db: Session = Depends(get_db)):
+def list_products(
+    request: Request,
+    db: Session = Depends(get_db),
+    limit: int = Query(50, ge=1, le=200, description="Productos por página"),
+    cursor: Optional[str] = Query(None, description="Cursor devuelto en X-Next-Cursor"),
+    sort: Literal["name", "-name", "price", "-price"] = Query("name"),
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    in_stock: bool = Query(False, description="Solo productos con stock"),
+    q: Optional[str] = Query(None, max_length=120, description="Prefijo del nombre"),
+):
+    """
+    Retorna una página de productos disponibles (público).
+    El cursor de la siguiente página viaja en las cabeceras X-Next-Cursor y Link.
+    Responde 304 a If-None-Match / If-Modified-Since sin leer filas completas.
+    """
+    params = dict(
+        limit=limit,
+        cursor=cursor,
+        sort=sort,
+        min_price=min_price,
+        max_price=max_price,
+        in_stock=in_stock,
+        name_prefix=q,
+    )
+    cache_control = settings.catalog_http_cache_control
+
+    # El ETag se calcula antes que el cuerpo: nunca queda asociado a datos más nuevos
+    etag, last_modified = get_catalog_etag(db, **params)
+    if is_not_modified(request, etag, last_modified):
+        return not_modified_response(etag, last_modified, cache_control)
+
+    try:
+        body, next_cursor = get_catalog_json(db, **params)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    response = set_cache_headers(
+        Response(content=body, media_type="application/json"), etag, last_modified, cache_control
+    )
+    if next_cursor:
+        next_url = request.url.include_query_params(cursor=next_cursor)
+        response.headers["X-Next-Cursor"] = next_cursor
+        response.headers["Link"] = f'<{next_url}>; rel="next"'
+    return response
+
+# -------------------------
+# 🔹 Público: Buscar productos
+# -------------------------
+@router.get("/search", response_model=List[ProductResponse])
+def search_products_endpoint(
+    q: str = Query(..., min_length=1, max_length=200, description="Texto a buscar en nombre y descripción"),
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db),
+):
     """
-    Retorna todos los productos disponibles (público).
+    Busca productos activos por nombre y descripción, ordenados por relevancia (público).
     """
-    return get_all_products(db)
+    return Response(content=get_search_json(db, q, limit=limit), media_type="application/json")
+
+# -------------------------
+# 🔒 Solo admin: Exportar catálogo (feeds / sincronizaciones)
+# -------------------------
+@router.get("/export")
+def export_products_endpoint(
+    format: Literal["ndjson", "csv"] = Query("ndjson"),
+    updated_since: Optional[datetime] = Query(None, description="Solo productos modificados desde esta fecha (ISO 8601)"),
+    current_admin=Depends(get_current_admin_user)
+):
+    """
+    Exporta todos los productos, incluidos los inactivos, en streaming (solo admin).
+    X-Export-Snapshot indica el valor a usar como updated_since en la siguiente sincronización.
+    """
+    snapshot = utc_now()
+    filename = f"products-{snapshot:%Y%m%dT%H%M%SZ}.{format}"
+    return StreamingResponse(
+        iter_product_export(format, updated_since=updated_since),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "X-Export-Snapshot": snapshot.isoformat(),
+        },
+    )
 
 # -------------------------
 # 🔹 Público: Obtener detalle de un producto
 # -------------------------
 @router.get("/{product_id}", response_model=ProductResponse)
-def get_product(product_id: str, db: Session = Depends(get_db)):
+def get_product(product_id: str, request: Request, db: Session = Depends(get_db)):
     """
     Retorna un producto específico (público).
+    Responde 304 si el cliente ya tiene la versión actual.
     """
-    product = get_product_by_id(db, product_id)
-    if not product:
+    cache_control = settings.catalog_http_cache_control
+    validators = get_product_etag(db, product_id)
+    if validators is None:
         raise HTTPException(status_code=404, detail="Producto no encontrado")
-    return product
+
+    etag, last_modified = validators
+    if is_not_modified(request, etag, last_modified):
+        return not_modified_response(etag, last_modified, cache_control)
+
+    body = get_product_json(db, product_id)
+    if body is None:
+        raise HTTPException(status_code=404, detail="Producto no encontrado")
+    return set_cache_headers(
+        Response(content=body, media_type="application/json"), etag, last_modified, cache_control
+    )
 
 # -------------------------
 # 🔒 Solo admin: Crear producto
 # -------------------------
-@router.post("/", response_model=ProductResponse)
+@router.post("/", response_model=ProductWithJobResponse)
 def create_product_endpoint(
     product_in: ProductCreate,
     db: Session = Depends(get_db),
@@ -51,18 +162,74 @@ def create_product_endpoint(
 ):
     """
     Crear un nuevo producto (solo admin).
-    Maneja base64 o URL de imagen si se envía.
+    Maneja base64 o URL de imagen si se envía; la imagen base64 se procesa en
+    segundo plano y su estado se consulta en /jobs/{image_job_id}.
     """
     try:
-        product = create_product(db, product_in)
-        return product
+        return _with_image_job(*create_product(db, product_in))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# -------------------------
+# 🔒 Solo admin: Crear producto con imagen binaria (multipart)
+# -------------------------
+@router.post("/upload", response_model=ProductWithJobResponse)
+def create_product_upload_endpoint(
+    name: str = Form(...),
+    price: float = Form(...),
+    stock: int = Form(...),
+    description: Optional[str] = Form(None),
+    is_active: bool = Form(True),
+    image: Optional[UploadFile] = File(None, description="JPEG, PNG, WebP o GIF"),
+    db: Session = Depends(get_db),
+    current_admin=Depends(get_current_admin_user)
+):
+    """
+    Igual que POST /products/ pero con la imagen como archivo binario (solo admin).
+    Evita el base64 (+33% de tamaño y decodificación en el request): el archivo se
+    copia a disco por bloques y se procesa en segundo plano.
+    """
+    product_in = ProductCreate(name=name, description=description, price=price, stock=stock, is_active=is_active)
+    image_path = spool_image_upload(image) if image is not None and image.filename else None
+    try:
+        return _with_image_job(*create_product(db, product_in, image_path=image_path))
+    except Exception as e:
+        if image_path is not None:
+            image_path.unlink(missing_ok=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+# -------------------------
+# 🔒 Solo admin: Importación masiva (CSV / NDJSON)
+# -------------------------
+@router.post("/import", response_model=ProductImportResult)
+def import_products_endpoint(
+    file: UploadFile = File(..., description="Archivo .csv o .ndjson con columnas de ProductCreate (+ id opcional)"),
+    format: Optional[Literal["csv", "ndjson"]] = Query(None, description="Por defecto se deduce de la extensión"),
+    chunk_size: int = Query(500, ge=1, le=5000),
+    db: Session = Depends(get_db),
+    current_admin=Depends(get_current_admin_user)
+):
+    """
+    Importa productos en bloques (solo admin).
+    Las filas con id existente se actualizan; las inválidas se reportan sin abortar.
+    Las imágenes base64 se encolan en la cola de trabajos.
+    """
+    fmt = format or detect_format(file.filename, file.content_type)
+    if fmt not in IMPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="Formato no reconocido: usa ?format=csv o ?format=ndjson")
+
+    return import_products(
+        db,
+        file.file,
+        fmt,
+        chunk_size=chunk_size,
+        defer_image=enqueue_product_image,
+    )
+
 # -------------------------
 # 🔒 Solo admin: Actualizar producto
 # -------------------------
-@router.put("/{product_id}", response_model=ProductResponse)
+@router.put("/{product_id}", response_model=ProductWithJobResponse)
 def update_product_endpoint(
     product_id: str,
     product: ProductUpdate,
@@ -75,7 +242,27 @@ def update_product_endpoint(
     existing = get_product_by_id(db, product_id)
     if not existing:
         raise HTTPException(status_code=404, detail="Producto no encontrado")
-    return update_product(db, product_id, product)
+    return _with_image_job(*update_product(db, product_id, product))
+
+# -------------------------
+# 🔒 Solo admin: Reemplazar la imagen de un producto (multipart)
+# -------------------------
+@router.put("/{product_id}/image", response_model=ProductWithJobResponse)
+def replace_product_image_endpoint(
+    product_id: str,
+    image: UploadFile = File(..., description="JPEG, PNG, WebP o GIF"),
+    db: Session = Depends(get_db),
+    current_admin=Depends(get_current_admin_user)
+):
+    """
+    Reemplaza la imagen de un producto con un archivo binario (solo admin).
+    Las variantes se generan en segundo plano; el estado se consulta en /jobs/{image_job_id}.
+    """
+    existing = get_product_by_id(db, product_id)
+    if not existing:
+        raise HTTPException(status_code=404, detail="Producto no encontrado")
+    image_path = spool_image_upload(image)
+    return _with_image_job(*replace_product_image(db, product_id, image_path))
 
 # -------------------------
 # 🔒 Solo admin: Eliminar producto
@@ -1,4 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from typing import List
 from app.schemas.user_schema import UserCreate, UserOut
@@ -12,7 +13,7 @@ def list_all_users(db: Session = Depends(get_db), current_user = Depends(get_cur
     return user_service.list_users(db)
 
 @router.post("/", response_model=UserOut, status_code=status.HTTP_201_CREATED)
-def create_new_user(user_in: UserCreate, db: Session = Depends(get_db), current_user = Depends(get_current_admin_user)):
-    if user_service.get_user_by_email(db, user_in.email):
+async def create_new_user(user_in: UserCreate, db: Session = Depends(get_db), current_user = Depends(get_current_admin_user)):
+    if await run_in_threadpool(user_service.get_user_by_email, db, user_in.email):
         raise HTTPException(status_code=400, detail="Email already registered")
-    return user_service.create_user(db, user_in)
+    return await user_service.create_user(db, user_in)
@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Optional, List
+from pydantic import BaseModel, Field, model_validator
+from typing import Literal, Optional, List
 
 
 # ✅ Entrada al agregar un item al carrito
@@ -39,3 +39,30 @@ class CartItemResponse(BaseModel):
 
     class Config:
         from_attributes = True
+
+
+# ✅ Carrito completo con totales (GET /cart)
+class CartSummaryResponse(BaseModel):
+    items: List[CartItemResponse]
+    total: float
+    cantidad_items: int
+
+
+# ✅ Operación de un lote (POST /cart/batch)
+class CartBatchOperation(BaseModel):
+    op: Literal["add", "set", "remove"]
+    product_id: str
+    quantity: Optional[int] = Field(None, ge=0)
+
+    @model_validator(mode="after")
+    def check_quantity(self):
+        if self.op == "add" and not self.quantity:
+            raise ValueError("add requiere quantity >= 1")
+        if self.op == "set" and self.quantity is None:
+            raise ValueError("set requiere quantity (0 elimina el producto)")
+        return self
+
+
+# ✅ Lote de operaciones sobre el carrito, aplicado en una sola transacción
+class CartBatchRequest(BaseModel):
+    operations: List[CartBatchOperation] = Field(..., min_length=1, max_length=200)
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional, Dict
+from typing import Optional, Dict, List
 from uuid import UUID
 
 
@@ -39,3 +39,23 @@ class ProductResponse(ProductBase):
 
     class Config:
         orm_mode = True  # Pydantic v2 reemplaza orm_mode
+
+
+# 🔹 Respuesta de creación/actualización (incluye el trabajo de imagen pendiente)
+class ProductWithJobResponse(ProductResponse):
+    image_job_id: Optional[str] = None
+
+
+# 🔹 Resultado de una importación masiva
+class ProductImportError(BaseModel):
+    row: int
+    error: str
+
+
+class ProductImportResult(BaseModel):
+    processed: int
+    inserted: int
+    updated: int
+    failed: int
+    images_deferred: int
+    errors: List[ProductImportError]
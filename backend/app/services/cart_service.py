@@ -1,80 +1,163 @@
+from typing import Dict, List, Optional, Tuple
+from uuid import UUID
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from app.models.cart import CartItem
 from app.models.product import Product
+from app.core.jobs import Job, job_queue
+from app.services.cart_store import CartLine, cart_store
+from app.services.cart_summary import repair_cart_summaries
 from fastapi import HTTPException
 
-def add_to_cart(user_uuid: str, product_uuid: str, quantity: int, price: float, db: Session):
-    """Agrega o actualiza un producto en el carrito."""
-    item = db.query(CartItem).filter(
-        CartItem.user_uuid == user_uuid,
-        CartItem.product_uuid == product_uuid
-    ).first()
-    
-    if item:
-        item.quantity += quantity
-    else:
-        item = CartItem(
-            user_uuid=user_uuid,
-            product_id=item.product_id,
-            quantity=quantity,
-            price=price
-        )
-        db.add(item)
-    
-    db.commit()
-
-def list_cart_items(user_uuid: str, db: Session):
-    return db.query(CartItem).filter(CartItem.user_uuid == user_uuid).all()
-
-def update_cart_item_quantity(user_uuid: str, product_uuid: str, quantity: int, db: Session):
-    item = db.query(CartItem).filter(
-        CartItem.user_uuid == user_uuid,
-        CartItem.product_uuid == product_uuid
-    ).first()
-    if item:
-        item.quantity = quantity
-        db.commit()
-
-def remove_cart_item(user_uuid: str, product_uuid: str, db: Session):
-    db.query(CartItem).filter(
-        CartItem.user_uuid == user_uuid,
-        CartItem.product_uuid == product_uuid
-    ).delete()
-    db.commit()
+# Todas las lecturas y escrituras del carrito pasan por cart_store
+# (base de datos o memoria con escritura diferida, según settings.cart_store_backend)
 
-def get_cart_total(user_uuid: str, db: Session) -> float:
-    items = db.query(CartItem).filter(CartItem.user_uuid == user_uuid).all()
-    if not items:
-        return 0.0
 
-    total = sum((item.product.price * item.quantity) for item in items if item.product)
-    return round(total, 2)
+# -------------------------
+# Lectura del carrito: items + productos en una sola consulta
+# -------------------------
+def get_cart_lines(db: Session, user_uuid) -> List[Tuple[CartLine, Product]]:
+    """
+    Devuelve [(línea, Product)] del usuario con una sola consulta,
+    en lugar de una consulta de Product por cada item.
+    """
+    return cart_store.lines(db, user_uuid)
+
+
+def get_cart_line(db: Session, user_uuid, product_id: UUID) -> Optional[CartLine]:
+    return cart_store.quantities(db, user_uuid).get(product_id)
+
+
+def cart_line_to_dict(item: CartLine, product: Product) -> Dict:
+    """Formato de CartItemResponse."""
+    return {
+        "product_id": str(product.id),
+        "name": product.name,
+        "price": product.price,
+        "quantity": item.quantity,
+        "subtotal": product.price * item.quantity,
+        "image_url": product.image_thumbnail,
+    }
+
+
+def get_cart_totals(db: Session, user_uuid) -> Dict:
+    """Total y número de líneas (en base de datos, la fila de carts leída por clave primaria)."""
+    total, count = cart_store.totals(db, user_uuid)
+    return {"total": round(total, 2), "cantidad_items": count}
+
+
+def get_cart_summary(db: Session, user_uuid) -> Dict:
+    """Items y totales del carrito a partir de la misma lectura."""
+    lines = get_cart_lines(db, user_uuid)
+    items = [cart_line_to_dict(item, product) for item, product in lines]
+    return {
+        "items": items,
+        "total": round(sum(line["subtotal"] for line in items), 2),
+        "cantidad_items": len(items),
+    }
+
+# -------------------------
+# Lote de cambios (POST /cart/batch)
+# -------------------------
+def apply_cart_batch(db: Session, user_uuid, operations: List) -> Dict:
+    """
+    Aplica operaciones add/set/remove en orden, en una sola transacción.
+    Productos y stock se validan con una consulta IN; si alguna operación no es
+    válida no se aplica ninguna. Devuelve el carrito resultante (get_cart_summary).
+    """
+    errors = []
+    product_ids = []
+    for index, operation in enumerate(operations):
+        try:
+            product_ids.append(UUID(operation.product_id))
+        except ValueError:
+            errors.append({"index": index, "product_id": operation.product_id, "error": "product_id inválido"})
+            product_ids.append(None)
+    if errors:
+        raise HTTPException(status_code=400, detail=errors)
+
+    unique_ids = set(product_ids)
+    products = {product.id: product for product in db.query(Product).filter(Product.id.in_(unique_ids))}
+    current = cart_store.quantities(db, user_uuid)
+
+    # Cantidades finales, partiendo de lo que ya hay en el carrito
+    quantities = {product_id: current[product_id].quantity for product_id in unique_ids if product_id in current}
+    for index, (operation, product_id) in enumerate(zip(operations, product_ids)):
+        product = products.get(product_id)
+        if operation.op == "remove":
+            quantities[product_id] = 0
+            continue
+        if product is None or not product.is_active:
+            errors.append({"index": index, "product_id": operation.product_id, "error": "Producto no encontrado"})
+            continue
+        if operation.op == "add":
+            quantities[product_id] = quantities.get(product_id, 0) + operation.quantity
+        else:
+            quantities[product_id] = operation.quantity
+
+    for product_id, quantity in quantities.items():
+        product = products.get(product_id)
+        if quantity and product is not None and product.stock < quantity:
+            errors.append({"product_id": str(product_id), "error": f"Stock insuficiente (disponible: {product.stock})"})
+    if errors:
+        raise HTTPException(status_code=400, detail=errors)
+
+    changed = {
+        product_id: quantity
+        for product_id, quantity in quantities.items()
+        if quantity != (current[product_id].quantity if product_id in current else 0)
+    }
+    if changed:
+        cart_store.set_quantities(db, user_uuid, changed)
+    return get_cart_summary(db, user_uuid)
+
+
+# -------------------------
+# Escrituras
+# -------------------------
+def add_to_cart(db: Session, user_uuid, product_id: UUID, quantity: int) -> CartLine:
+    """
+    Suma quantity a la línea del producto (o la crea). En base de datos es un único
+    INSERT ... ON CONFLICT DO UPDATE ... RETURNING, sin duplicados concurrentes.
+    """
+    return cart_store.add(db, user_uuid, product_id, quantity)
+
+def update_cart_item_quantity(db: Session, user_uuid, product_id: UUID, quantity: int):
+    cart_store.set_quantities(db, user_uuid, {product_id: quantity})
 
-def clear_cart(user_uuid: str, db: Session) -> None:
+def remove_cart_item(db: Session, user_uuid, product_id: UUID):
+    cart_store.set_quantities(db, user_uuid, {product_id: 0})
+
+def get_cart_total(user_uuid: str, db: Session) -> float:
+    return get_cart_totals(db, user_uuid)["total"]
+
+def clear_cart(user_uuid: str, db: Session) -> int:
     """
     Elimina todos los items del carrito del usuario una vez realizado el pago.
     """
-    items = db.query(CartItem).filter(CartItem.user_uuid == user_uuid).all()
-    for item in items:
-        db.delete(item)
-    db.commit()
+    return cart_store.clear(db, user_uuid)
 
+def flush_cart(user_uuid) -> int:
+    """Persiste los cambios pendientes del carrito (no-op en el backend de base de datos)."""
+    return cart_store.flush(user_uuid)
 
 
 def get_cart_items(user_uuid: str, db: Session):
     """
     Devuelve los items del carrito listos para PaymentResponse.items.
     """
-    items = db.query(CartItem).filter(CartItem.user_uuid == user_uuid).all()
-    result = []
-    for item in items:
-        product = db.query(Product).filter(Product.id == item.product_id).first()
-        if product:
-            result.append({
-                "product_id": product.id,
-                "name": product.name,
-                "quantity": item.quantity,
-                "unit_price": product.price
-            })
-    return result
\ No newline at end of file
+    return [
+        {
+            "product_id": product.id,
+            "name": product.name,
+            "quantity": item.quantity,
+            "unit_price": product.price
+        }
+        for item, product in get_cart_lines(db, user_uuid)
+    ]
+
+
+# -------------------------
+# Resúmenes de carts
+# -------------------------
+def enqueue_cart_summary_repair(dry_run: bool = False) -> Job:
+    """Encola la verificación (y corrección, salvo dry_run) de la tabla carts."""
+    return job_queue.enqueue("cart_summary_repair", repair_cart_summaries, dry_run=dry_run, max_attempts=1)
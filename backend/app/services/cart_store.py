@@ -0,0 +1,441 @@
+# app/services/cart_store.py
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from uuid import UUID, uuid4
+
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.logger import logger
+from app.models.cart import CartItem
+from app.models.product import Product
+from app.services.cart_summary import apply_cart_delta, read_cart_summary, reset_cart_summary
+
+
+@dataclass
+class CartLine:
+    """Línea de carrito independiente de la sesión (mismos atributos que CartItem)."""
+
+    cart_item_uuid: UUID
+    product_id: UUID
+    quantity: int
+
+
+# -------------------------
+# Escritura en cart_items
+# -------------------------
+def _upsert_statement(db: Session):
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert(CartItem)
+    if dialect == "sqlite":
+        return sqlite.insert(CartItem)
+    return None
+
+
+def write_cart_quantities(db: Session, changes: Dict[UUID, Dict[UUID, Tuple[UUID, int]]]):
+    """
+    Aplica cantidades finales {user_uuid: {product_id: (cart_item_uuid, cantidad)}}:
+    cantidad 0 borra la línea; el resto se escribe con un upsert multi-fila sobre
+    (user_uuid, product_id). Actualiza el resumen de carts con los deltas. No hace commit.
+    """
+    deltas = _summary_deltas(db, changes)
+    rows = []
+    for user_uuid, lines in changes.items():
+        removed = [product_id for product_id, (_, quantity) in lines.items() if quantity <= 0]
+        if removed:
+            db.query(CartItem).filter(
+                CartItem.user_uuid == user_uuid, CartItem.product_id.in_(removed)
+            ).delete(synchronize_session=False)
+        rows.extend(
+            {"cart_item_uuid": cart_item_uuid, "user_uuid": user_uuid, "product_id": product_id, "quantity": quantity}
+            for product_id, (cart_item_uuid, quantity) in lines.items()
+            if quantity > 0
+        )
+    if rows:
+        _write_rows(db, rows)
+    for user_uuid, (count_delta, subtotal_delta) in deltas.items():
+        apply_cart_delta(db, user_uuid, count_delta, subtotal_delta)
+
+
+def _summary_deltas(db: Session, changes: Dict[UUID, Dict[UUID, Tuple[UUID, int]]]) -> Dict[UUID, Tuple[int, float]]:
+    """
+    {user_uuid: (delta de líneas, delta de subtotal)} de pasar de las cantidades
+    actuales a las de changes. Las líneas existentes se bloquean (FOR UPDATE en
+    PostgreSQL) para que otra escritura no cambie la cantidad de partida.
+    """
+    product_ids = {product_id for lines in changes.values() for product_id in lines}
+    current = {
+        (row.user_uuid, row.product_id): row.quantity
+        for row in db.query(CartItem.user_uuid, CartItem.product_id, CartItem.quantity)
+        .filter(CartItem.user_uuid.in_(list(changes)), CartItem.product_id.in_(product_ids))
+        .with_for_update()
+    }
+    prices = dict(db.query(Product.id, Product.price).filter(Product.id.in_(product_ids)).all())
+
+    deltas = {}
+    for user_uuid, lines in changes.items():
+        count_delta, subtotal_delta = 0, 0.0
+        for product_id, (_, quantity) in lines.items():
+            quantity = max(quantity, 0)
+            before = current.get((user_uuid, product_id), 0)
+            count_delta += (quantity > 0) - (before > 0)
+            subtotal_delta += (quantity - before) * prices.get(product_id, 0.0)
+        deltas[user_uuid] = (count_delta, subtotal_delta)
+    return deltas
+
+
+def _write_rows(db: Session, rows: List[Dict]):
+    stmt = _upsert_statement(db)
+    if stmt is not None:
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[CartItem.user_uuid, CartItem.product_id],
+            set_={"quantity": stmt.excluded.quantity},
+        )
+        db.execute(stmt, rows)
+        return
+
+    # Otros motores: lectura + escritura por línea
+    for row in rows:
+        item = db.query(CartItem).filter(
+            CartItem.user_uuid == row["user_uuid"], CartItem.product_id == row["product_id"]
+        ).first()
+        if item:
+            item.quantity = row["quantity"]
+        else:
+            db.add(CartItem(**row))
+    db.flush()
+
+
+# -------------------------
+# Interfaz
+# -------------------------
+class CartStore(ABC):
+    """
+    Almacén de carritos. Los endpoints y servicios del carrito pasan por aquí;
+    la implementación decide si cada cambio es un commit o se agrupa.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    def quantities(self, db: Session, user_uuid) -> Dict[UUID, CartLine]:
+        ...
+
+    @abstractmethod
+    def lines(self, db: Session, user_uuid) -> List[Tuple[CartLine, Product]]:
+        """[(línea, producto)] ordenado por nombre de producto."""
+
+    def totals(self, db: Session, user_uuid) -> Tuple[float, int]:
+        lines = self.lines(db, user_uuid)
+        return sum(product.price * line.quantity for line, product in lines), len(lines)
+
+    @abstractmethod
+    def add(self, db: Session, user_uuid, product_id: UUID, quantity: int) -> CartLine:
+        ...
+
+    @abstractmethod
+    def set_quantities(self, db: Session, user_uuid, quantities: Dict[UUID, int]):
+        """Fija cantidades finales; 0 elimina la línea."""
+
+    @abstractmethod
+    def clear(self, db: Session, user_uuid) -> int:
+        ...
+
+    def flush(self, user_uuid=None) -> int:
+        """Persiste los cambios pendientes (del usuario o de todos). Devuelve líneas escritas."""
+        return 0
+
+    def start(self):
+        pass
+
+    def shutdown(self):
+        pass
+
+    def stats(self) -> Dict:
+        return {"backend": self.name}
+
+
+# -------------------------
+# Base de datos (cada cambio es un commit)
+# -------------------------
+class DatabaseCartStore(CartStore):
+    name = "database"
+
+    def quantities(self, db: Session, user_uuid) -> Dict[UUID, CartLine]:
+        rows = db.query(CartItem.cart_item_uuid, CartItem.product_id, CartItem.quantity).filter(
+            CartItem.user_uuid == user_uuid
+        )
+        return {row.product_id: CartLine(row.cart_item_uuid, row.product_id, row.quantity) for row in rows}
+
+    def lines(self, db: Session, user_uuid) -> List[Tuple[CartItem, Product]]:
+        # Un único JOIN en lugar de una consulta de Product por item
+        return (
+            db.query(CartItem, Product)
+            .join(Product, CartItem.product_id == Product.id)
+            .filter(CartItem.user_uuid == user_uuid)
+            .order_by(Product.name, CartItem.cart_item_uuid)
+            .all()
+        )
+
+    def totals(self, db: Session, user_uuid) -> Tuple[float, int]:
+        # Fila de carts mantenida en cada escritura: búsqueda por clave primaria
+        return read_cart_summary(db, user_uuid)
+
+    def add(self, db: Session, user_uuid, product_id: UUID, quantity: int) -> CartLine:
+        """
+        INSERT ... ON CONFLICT (user_uuid, product_id) DO UPDATE SET
+        quantity = quantity + excluded.quantity RETURNING: una sola sentencia, sin
+        duplicados aunque lleguen dos altas a la vez. El resumen de carts se
+        actualiza en la misma transacción (precio leído por la propia sentencia).
+        """
+        values = {"cart_item_uuid": uuid4(), "user_uuid": user_uuid, "product_id": product_id, "quantity": quantity}
+        price = select(Product.price).where(Product.id == product_id).scalar_subquery()
+        stmt = _upsert_statement(db)
+        if stmt is not None:
+            stmt = stmt.values(**values)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[CartItem.user_uuid, CartItem.product_id],
+                set_={"quantity": CartItem.quantity + stmt.excluded.quantity},
+            ).returning(CartItem.cart_item_uuid, CartItem.quantity)
+            row = db.execute(stmt).one()
+            # Si la cantidad resultante es la añadida, la línea es nueva
+            apply_cart_delta(db, user_uuid, int(row.quantity == quantity), quantity * price)
+            db.commit()
+            return CartLine(row.cart_item_uuid, product_id, row.quantity)
+
+        # Otros motores: lectura + escritura (el índice único evita duplicados)
+        item = db.query(CartItem).filter(CartItem.user_uuid == user_uuid, CartItem.product_id == product_id).first()
+        if item:
+            item.quantity += quantity
+        else:
+            item = CartItem(**values)
+            db.add(item)
+        db.flush()
+        apply_cart_delta(db, user_uuid, int(item.quantity == quantity), quantity * price)
+        db.commit()
+        return CartLine(item.cart_item_uuid, product_id, item.quantity)
+
+    def set_quantities(self, db: Session, user_uuid, quantities: Dict[UUID, int]):
+        # El uuid solo se usa si la línea es nueva; el upsert conserva el de las existentes
+        changes = {product_id: (uuid4(), quantity) for product_id, quantity in quantities.items()}
+        write_cart_quantities(db, {user_uuid: changes})
+        db.commit()
+
+    def clear(self, db: Session, user_uuid) -> int:
+        deleted = db.query(CartItem).filter(CartItem.user_uuid == user_uuid).delete(synchronize_session=False)
+        reset_cart_summary(db, user_uuid)
+        db.commit()
+        return deleted
+
+
+# -------------------------
+# Memoria con escritura diferida (write-behind)
+# -------------------------
+class _CachedCart:
+    __slots__ = ("lines", "dirty", "last_access")
+
+    def __init__(self, lines: Dict[UUID, CartLine]):
+        self.lines = lines
+        self.dirty = set()  # product_id con cambios sin persistir
+        self.last_access = time.monotonic()
+
+
+class WriteBehindCartStore(CartStore):
+    """
+    Mantiene en memoria los carritos activos y persiste los cambios en cart_items
+    en segundo plano: cada flush_interval segundos, todas las líneas modificadas
+    (solo su último valor) se escriben en una sola transacción.
+
+    Un carrito se carga desde la base la primera vez que se usa, así que tras un
+    reinicio se recupera lo ya persistido; los cambios pendientes se escriben al
+    detener la app y antes del checkout. Si el proceso muere, se pierde como mucho
+    flush_interval segundos de cambios.
+    Cada worker tiene su propia memoria: requiere un solo worker o afinidad por usuario.
+    """
+
+    name = "memory"
+
+    def __init__(self, flush_interval: float = 2.0, idle_ttl: float = 1800.0):
+        self.flush_interval = flush_interval
+        self.idle_ttl = idle_ttl
+        self._carts: Dict[UUID, _CachedCart] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.loads = 0
+        self.writes = 0
+        self.flushes = 0
+        self.lines_flushed = 0
+        self.flush_errors = 0
+
+    # --- ciclo de vida ---
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="cart-flusher", daemon=True)
+            self._thread.start()
+
+    def shutdown(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stop.set()
+            thread.join()
+        self.flush()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Error al persistir carritos en segundo plano")
+            self._evict_idle()
+
+    def _evict_idle(self):
+        limit = time.monotonic() - self.idle_ttl
+        with self._lock:
+            for user_uuid in [u for u, cart in self._carts.items() if not cart.dirty and cart.last_access < limit]:
+                del self._carts[user_uuid]
+
+    # --- acceso ---
+    def _cart(self, db: Session, user_uuid) -> _CachedCart:
+        with self._lock:
+            cart = self._carts.get(user_uuid)
+            if cart is not None:
+                cart.last_access = time.monotonic()
+                return cart
+
+        # La carga ocurre fuera del lock; si otro hilo ganó, se usa su copia
+        loaded = _CachedCart(DatabaseCartStore().quantities(db, user_uuid))
+        with self._lock:
+            self.loads += 1
+            return self._carts.setdefault(user_uuid, loaded)
+
+    def quantities(self, db: Session, user_uuid) -> Dict[UUID, CartLine]:
+        cart = self._cart(db, user_uuid)
+        with self._lock:
+            return {product_id: CartLine(line.cart_item_uuid, line.product_id, line.quantity) for product_id, line in cart.lines.items()}
+
+    def lines(self, db: Session, user_uuid) -> List[Tuple[CartLine, Product]]:
+        lines = self.quantities(db, user_uuid)
+        if not lines:
+            return []
+        products = db.query(Product).filter(Product.id.in_(list(lines))).all()
+        result = [(lines[product.id], product) for product in products]
+        result.sort(key=lambda pair: (pair[1].name, str(pair[0].cart_item_uuid)))
+        return result
+
+    def add(self, db: Session, user_uuid, product_id: UUID, quantity: int) -> CartLine:
+        cart = self._cart(db, user_uuid)
+        with self._lock:
+            line = cart.lines.get(product_id)
+            if line is None:
+                line = cart.lines[product_id] = CartLine(uuid4(), product_id, 0)
+            line.quantity += quantity
+            cart.dirty.add(product_id)
+            self.writes += 1
+            return CartLine(line.cart_item_uuid, product_id, line.quantity)
+
+    def set_quantities(self, db: Session, user_uuid, quantities: Dict[UUID, int]):
+        cart = self._cart(db, user_uuid)
+        with self._lock:
+            for product_id, quantity in quantities.items():
+                if quantity <= 0:
+                    cart.lines.pop(product_id, None)
+                elif product_id in cart.lines:
+                    cart.lines[product_id].quantity = quantity
+                else:
+                    cart.lines[product_id] = CartLine(uuid4(), product_id, quantity)
+                cart.dirty.add(product_id)
+            self.writes += 1
+
+    def clear(self, db: Session, user_uuid) -> int:
+        cart = self._cart(db, user_uuid)
+        with self._lock:
+            count = len(cart.lines)
+            cart.dirty.update(cart.lines)
+            cart.lines.clear()
+            self.writes += 1
+        return count
+
+    def flush(self, user_uuid=None) -> int:
+        # Un flush a la vez: nunca se escribe un valor viejo encima de uno nuevo
+        with self._flush_lock:
+            changes: Dict[UUID, Dict[UUID, Tuple[UUID, int]]] = {}
+            with self._lock:
+                carts = [(user_uuid, self._carts.get(user_uuid))] if user_uuid is not None else list(self._carts.items())
+                for owner, cart in carts:
+                    if cart is None or not cart.dirty:
+                        continue
+                    lines = {}
+                    for product_id in cart.dirty:
+                        line = cart.lines.get(product_id)
+                        lines[product_id] = (line.cart_item_uuid, line.quantity) if line else (None, 0)
+                    changes[owner] = lines
+                    cart.dirty = set()
+            if not changes:
+                return 0
+
+            db = SessionLocal()
+            try:
+                write_cart_quantities(db, changes)
+                db.commit()
+            except Exception:
+                db.rollback()
+                # Se vuelven a marcar como pendientes para el siguiente intento
+                with self._lock:
+                    for owner, lines in changes.items():
+                        cart = self._carts.get(owner)
+                        if cart is None:
+                            cart = self._carts[owner] = _CachedCart({})
+                            logger.error(f"Carrito {owner} descartado con cambios sin persistir")
+                        cart.dirty.update(lines)
+                    self.flush_errors += 1
+                raise
+            finally:
+                db.close()
+
+            written = sum(len(lines) for lines in changes.values())
+            with self._lock:
+                self.flushes += 1
+                self.lines_flushed += written
+            return written
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "backend": self.name,
+                "carts": len(self._carts),
+                "dirty_carts": sum(1 for cart in self._carts.values() if cart.dirty),
+                "loads": self.loads,
+                "writes": self.writes,
+                "flushes": self.flushes,
+                "lines_flushed": self.lines_flushed,
+                "flush_errors": self.flush_errors,
+            }
+
+
+def get_cart_store() -> CartStore:
+    """Backend configurado en settings.cart_store_backend ("database" o "memory")."""
+    if settings.cart_store_backend == "memory":
+        return WriteBehindCartStore(
+            flush_interval=settings.cart_flush_interval_seconds,
+            idle_ttl=settings.cart_idle_ttl_seconds,
+        )
+    if settings.cart_store_backend == "database":
+        return DatabaseCartStore()
+    raise ValueError(f"Backend de carrito no soportado: {settings.cart_store_backend}")
+
+
+# Instancia global (arranca y se detiene en el lifespan de la app)
+cart_store = get_cart_store()
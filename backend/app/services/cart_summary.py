@@ -0,0 +1,217 @@
+# app/services/cart_summary.py
+from typing import Dict, Iterable, List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import func, select, union, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.core.database import SessionLocal
+from app.core.logger import logger
+from app.core.time_utils import utc_now
+from app.models.cart import Cart, CartItem
+from app.models.product import Product
+
+# Diferencia de subtotal que se tolera por redondeo al comparar con el recálculo
+SUBTOTAL_TOLERANCE = 0.005
+MAX_REPORTED_MISMATCHES = 50
+
+# La fila de carts guarda (item_count, subtotal) y se mantiene con deltas en la
+# misma transacción que el cambio en cart_items. Si falta (carrito anterior a la
+# tabla), se crea recalculando desde cart_items. repair_cart_summaries corrige
+# cualquier desviación.
+
+
+def _summary_insert(db: Session):
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert(Cart)
+    if dialect == "sqlite":
+        return sqlite.insert(Cart)
+    return None
+
+
+def compute_cart_summaries(db: Session, user_uuids: Iterable) -> Dict[UUID, Tuple[int, float]]:
+    """Recalcula {user_uuid: (líneas, subtotal)} desde cart_items con una consulta agregada."""
+    user_uuids = list(user_uuids)
+    if not user_uuids:
+        return {}
+    rows = (
+        db.query(CartItem.user_uuid, func.count(CartItem.cart_item_uuid), func.sum(Product.price * CartItem.quantity))
+        .join(Product, CartItem.product_id == Product.id)
+        .filter(CartItem.user_uuid.in_(user_uuids))
+        .group_by(CartItem.user_uuid)
+    )
+    summaries = {user_uuid: (0, 0.0) for user_uuid in user_uuids}
+    for user_uuid, count, subtotal in rows:
+        summaries[user_uuid] = (count, subtotal or 0.0)
+    return summaries
+
+
+def write_cart_summaries(db: Session, summaries: Dict[UUID, Tuple[int, float]]):
+    """Fija los valores de las filas de carts (creándolas si faltan). No hace commit."""
+    if not summaries:
+        return
+    now = utc_now()
+    rows = [
+        {"user_uuid": user_uuid, "item_count": count, "subtotal": subtotal, "updated_at": now}
+        for user_uuid, (count, subtotal) in summaries.items()
+    ]
+    stmt = _summary_insert(db)
+    if stmt is not None:
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Cart.user_uuid],
+            set_={"item_count": stmt.excluded.item_count, "subtotal": stmt.excluded.subtotal, "updated_at": now},
+        )
+        db.execute(stmt, rows)
+        return
+    for row in rows:
+        db.merge(Cart(**row))
+    db.flush()
+
+
+def apply_cart_delta(db: Session, user_uuid, count_delta: int, subtotal_delta):
+    """
+    Suma los deltas a la fila del usuario. Debe llamarse después de escribir en
+    cart_items y antes del commit. subtotal_delta puede ser un número o una
+    expresión SQL (p. ej. cantidad * precio leído en la misma sentencia).
+    """
+    if not count_delta and isinstance(subtotal_delta, (int, float)) and not subtotal_delta:
+        return
+    now = utc_now()
+    updated = db.execute(
+        update(Cart)
+        .where(Cart.user_uuid == user_uuid)
+        .values(item_count=Cart.item_count + count_delta, subtotal=Cart.subtotal + subtotal_delta, updated_at=now)
+    ).rowcount
+    if updated:
+        return
+
+    # Sin fila: se crea con el recálculo (que ya incluye este cambio). Si otra
+    # transacción la creó entretanto, se le aplica el delta.
+    count, subtotal = compute_cart_summaries(db, [user_uuid])[user_uuid]
+    stmt = _summary_insert(db)
+    if stmt is None:
+        db.merge(Cart(user_uuid=user_uuid, item_count=count, subtotal=subtotal, updated_at=now))
+        db.flush()
+        return
+    stmt = stmt.values(user_uuid=user_uuid, item_count=count, subtotal=subtotal, updated_at=now)
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[Cart.user_uuid],
+            set_={"item_count": Cart.item_count + count_delta, "subtotal": Cart.subtotal + subtotal_delta, "updated_at": now},
+        )
+    )
+
+
+def reset_cart_summary(db: Session, user_uuid):
+    """Carrito vaciado. No hace commit."""
+    db.execute(
+        update(Cart).where(Cart.user_uuid == user_uuid).values(item_count=0, subtotal=0.0, updated_at=utc_now())
+    )
+
+
+def apply_price_change(db: Session, product_id, old_price: float, new_price: float) -> int:
+    """
+    Ajusta el subtotal de los carritos que contienen el producto:
+    subtotal += (nuevo - anterior) * cantidad. No hace commit.
+    """
+    if old_price == new_price:
+        return 0
+    quantity = (
+        select(CartItem.quantity)
+        .where(CartItem.user_uuid == Cart.user_uuid, CartItem.product_id == product_id)
+        .scalar_subquery()
+    )
+    return db.execute(
+        update(Cart)
+        .where(Cart.user_uuid.in_(select(CartItem.user_uuid).where(CartItem.product_id == product_id)))
+        .values(subtotal=Cart.subtotal + (new_price - old_price) * quantity, updated_at=utc_now())
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+
+def refresh_cart_summaries_for_products(db: Session, product_ids: List) -> int:
+    """
+    Recalcula los carritos que contienen alguno de los productos (cambios de
+    precio masivos, como la importación). No hace commit.
+    """
+    user_uuids = [
+        row.user_uuid
+        for row in db.query(CartItem.user_uuid).filter(CartItem.product_id.in_(product_ids)).distinct()
+    ]
+    write_cart_summaries(db, compute_cart_summaries(db, user_uuids))
+    return len(user_uuids)
+
+
+def read_cart_summary(db: Session, user_uuid) -> Tuple[float, int]:
+    """(subtotal, líneas) con una búsqueda por clave primaria; crea la fila si falta."""
+    row = db.query(Cart.subtotal, Cart.item_count).filter(Cart.user_uuid == user_uuid).first()
+    if row is not None:
+        return row.subtotal, row.item_count
+
+    count, subtotal = compute_cart_summaries(db, [user_uuid])[user_uuid]
+    stmt = _summary_insert(db)
+    if stmt is not None:
+        db.execute(
+            stmt.values(user_uuid=user_uuid, item_count=count, subtotal=subtotal, updated_at=utc_now())
+            .on_conflict_do_nothing(index_elements=[Cart.user_uuid])
+        )
+        db.commit()
+    return subtotal, count
+
+
+# -------------------------
+# Verificación y reparación
+# -------------------------
+def repair_cart_summaries(batch_size: int = 500, dry_run: bool = False) -> Dict:
+    """
+    Compara cada fila de carts con el recálculo desde cart_items (por bloques de
+    usuarios) y corrige las que no coinciden; también crea las que faltan.
+    Pensado para ejecutarse como trabajo en segundo plano (ver /cart/summaries/repair).
+    """
+    db = SessionLocal()
+    checked = repaired = 0
+    mismatches: List[Dict] = []
+    try:
+        users = union(select(Cart.user_uuid), select(CartItem.user_uuid.label("user_uuid"))).subquery()
+        last: Optional[UUID] = None
+        while True:
+            query = select(users.c.user_uuid).order_by(users.c.user_uuid).limit(batch_size)
+            if last is not None:
+                query = query.where(users.c.user_uuid > last)
+            batch = list(db.execute(query).scalars())
+            if not batch:
+                break
+            last = batch[-1]
+
+            stored = {
+                row.user_uuid: (row.item_count, row.subtotal)
+                for row in db.query(Cart.user_uuid, Cart.item_count, Cart.subtotal).filter(Cart.user_uuid.in_(batch))
+            }
+            expected = compute_cart_summaries(db, batch)
+            fixes = {}
+            for user_uuid, (count, subtotal) in expected.items():
+                current = stored.get(user_uuid)
+                if current is None or current[0] != count or abs(current[1] - subtotal) > SUBTOTAL_TOLERANCE:
+                    fixes[user_uuid] = (count, subtotal)
+                    if len(mismatches) < MAX_REPORTED_MISMATCHES:
+                        mismatches.append({
+                            "user_uuid": str(user_uuid),
+                            "stored": list(current) if current else None,
+                            "expected": [count, round(subtotal, 2)],
+                        })
+            checked += len(batch)
+            repaired += len(fixes)
+            if fixes and not dry_run:
+                write_cart_summaries(db, fixes)
+                db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    if repaired:
+        logger.warning(f"Resúmenes de carrito {'desviados' if dry_run else 'reparados'}: {repaired} de {checked}")
+    return {"checked": checked, "repaired": 0 if dry_run else repaired, "mismatched": repaired, "mismatches": mismatches}
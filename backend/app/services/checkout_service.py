@@ -1,81 +1,233 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from uuid import UUID
 from sqlalchemy.orm import Session
 from fastapi import HTTPException
-from app.services.cart_service import get_cart_total, clear_cart, list_cart_items
+from fastapi.concurrency import run_in_threadpool
+import anyio
+import httpx
+from app.services.cart_service import clear_cart, flush_cart, get_cart_lines
+from app.services.idempotency_service import idempotency_store, request_fingerprint
+from app.services.stock_service import StockReservation, release_stock, reserve_stock
 from app.models.user import User
-from app.models.product import Product
-import requests
 from app.schemas.payment_schema import PurchasedProduct
-from app.models.cart import CartItem
 
-from app.core.config import settings
+from app.core.http_client import payment_http_client
+from app.core.logger import logger
+from app.core.timing import StageTimings, timed
 
-MOCK_PAYMENT_URL = settings.mock_payment_url
+# Duración de cada etapa del checkout en este worker (ver /metrics)
+checkout_timings = StageTimings()
 
-def process_checkout(user: User, card_data: dict, db: Session):
+
+async def _post_to_gateway(path: str, payload: dict) -> httpx.Response:
+    """POST al servicio de pagos por el cliente compartido; timeouts y caídas se traducen a 504/502."""
+    try:
+        return await payment_http_client.post(path, json=payload)
+    except httpx.TimeoutException:
+        logger.warning(f"Timeout llamando al servicio de pagos ({path})")
+        raise HTTPException(status_code=504, detail="El servicio de pagos no respondió a tiempo")
+    except httpx.HTTPError as e:
+        logger.warning(f"Error de conexión con el servicio de pagos ({path}): {e}")
+        raise HTTPException(status_code=502, detail="No se pudo contactar con el servicio de pagos")
+
+
+def _snapshot_cart(user_uuid, db: Session) -> Tuple[float, List[PurchasedProduct]]:
     """
-    Procesa el flujo completo del pago:
-    1️⃣ Valida la tarjeta.
-    2️⃣ Calcula el total del carrito.
-    3️⃣ Llama al mock de pago.
-    4️⃣ Devuelve los productos comprados.
-    5️⃣ Limpia el carrito si fue exitoso.
+    Lee el carrito una sola vez (líneas + productos en una consulta) y deriva de
+    esa misma lectura el importe a cobrar y los productos comprados.
     """
+    # Con el almacén en memoria, la base debe reflejar el carrito antes de cobrar
+    flush_cart(user_uuid)
+    items = [
+        PurchasedProduct(
+            product_id=str(product.id),
+            product_name=product.name,
+            image_url=product.image_thumbnail,
+            quantity=item.quantity,
+            price=product.price,
+            subtotal=round(product.price * item.quantity, 2)
+        )
+        for item, product in get_cart_lines(db, user_uuid)
+    ]
+    # Se cierra la transacción: la conexión vuelve al pool mientras se espera al pago
+    db.rollback()
+    return round(sum(item.price * item.quantity for item in items), 2), items
+
+
+def _reserve_stock(items: List[PurchasedProduct], db: Session) -> StockReservation:
+    quantities: Dict[UUID, int] = {}
+    for item in items:
+        product_id = UUID(item.product_id)
+        quantities[product_id] = quantities.get(product_id, 0) + item.quantity
+    return reserve_stock(db, quantities)
+
+
+def _log_unknown_payment(user: User, total: float, reservation: StockReservation):
+    logger.error(
+        f"Resultado desconocido del pago de {total} para el usuario {user.user_uuid}: "
+        f"se conserva la reserva de stock {reservation.quantities} hasta conciliarla"
+    )
 
-    # 1️⃣ Validar tarjeta
-    validate_response = requests.post(f"{MOCK_PAYMENT_URL}/cards/validate", json=card_data)
+
+def _clear_after_payment(user_uuid, db: Session):
+    clear_cart(user_uuid=user_uuid, db=db)
+    flush_cart(user_uuid)
+
+
+async def _validate_card(card_data: dict, timings: Dict[str, float]) -> str:
+    with timed(timings, "card_validation"):
+        validate_response = await _post_to_gateway("/cards/validate", card_data)
     if validate_response.status_code != 200:
         raise HTTPException(status_code=400, detail="Error al validar la tarjeta")
 
-    card_info = validate_response.json()
-    account_uuid = card_info.get("account_uuid")
+    account_uuid = validate_response.json().get("account_uuid")
     if not account_uuid:
         raise HTTPException(status_code=400, detail="No se recibió account_uuid del servicio de tarjeta")
+    return account_uuid
 
-    # 2️⃣ Obtener total del carrito
-    total = get_cart_total(user_uuid=user.user_uuid, db=db)
-    if total <= 0:
-        raise HTTPException(status_code=400, detail="El carrito está vacío o el total es inválido")
 
-    # 3️⃣ Preparar payload para /payments
-    payload = {
-        "account_uuid": account_uuid,
-        "amount": total,
-        "description": "Compra en eShop"
-    }
+async def _load_cart(user_uuid, db: Session, timings: Dict[str, float]) -> Tuple[float, List[PurchasedProduct]]:
+    with timed(timings, "cart_snapshot"):
+        return await run_in_threadpool(_snapshot_cart, user_uuid, db)
+
+
+async def process_checkout(
+    user: User,
+    card_data: dict,
+    db: Session,
+    timings: Optional[Dict[str, float]] = None,
+    before_payment: Optional[Callable[[], Awaitable[None]]] = None,
+):
+    """
+    Procesa el flujo completo del pago:
+    1️⃣ Valida la tarjeta y, a la vez, lee el carrito (total y productos).
+    2️⃣ Reserva el stock de todas las líneas (todo o nada).
+    3️⃣ Llama al mock de pago con el total de esa lectura; si lo rechaza, libera el stock
+       (con un resultado desconocido la reserva se conserva para conciliarla).
+    4️⃣ Limpia el carrito si fue exitoso.
+    5️⃣ Devuelve los productos comprados (de la misma lectura).
 
-    print("Payload que se enviará a /payments:", payload)  # 🔹 depuración
-
-    payment_response = requests.post(f"{MOCK_PAYMENT_URL}/payments/", json=payload)
-    if payment_response.status_code != 200:
-        raise HTTPException(status_code=400, detail="Error procesando el pago")
-
-    data = payment_response.json()
-    if data.get("status") != "aprobado":
-        raise HTTPException(status_code=400, detail="Pago rechazado")
-
-   # 4️⃣ Limpiar carrito tras pago exitoso
-    cart_items = db.query(CartItem).filter(CartItem.user_uuid == user.user_uuid).all()
-    purchased_items = []
-    
-    for item in cart_items:
-        product = db.query(Product).filter(Product.id == item.product_id).first()
-        if product:
-            purchased_items.append(
-                PurchasedProduct(
-                    product_id=str(product.id),
-                    product_name=product.name,
-                    image_url=product.image_thumbnail , # ✅ sin comillas
-                    quantity=item.quantity,
-                    price=product.price,
-                    subtotal=round(product.price * item.quantity, 2)
-                    
-                )
+    Las llamadas al servicio de pagos se esperan sin ocupar un hilo ni una
+    conexión a la base; el trabajo con la base va al threadpool.
+    La duración de cada etapa (en segundos) se deja en timings y en checkout_timings.
+    before_payment se espera justo antes de enviar el cobro (ver process_checkout_once).
+    """
+    timings = {} if timings is None else timings
+    start = time.perf_counter()
+    try:
+        # 1️⃣ Etapas independientes en paralelo. Se espera a ambas aunque una falle:
+        # la lectura del carrito usa la sesión, que se cierra al terminar la petición
+        with timed(timings, "prepare"):
+            card_result, cart_result = await asyncio.gather(
+                _validate_card(card_data, timings),
+                _load_cart(user.user_uuid, db, timings),
+                return_exceptions=True,
             )
+        for result in (card_result, cart_result):
+            if isinstance(result, BaseException):
+                raise result
+        account_uuid = card_result
+        total, purchased_items = cart_result
+
+        if total <= 0:
+            raise HTTPException(status_code=400, detail="El carrito está vacío o el total es inválido")
+
+        # 2️⃣ Reservar stock: un UPDATE condicional para todas las líneas
+        with timed(timings, "stock_reservation"):
+            reservation = await run_in_threadpool(_reserve_stock, purchased_items, db)
+        if not reservation.ok:
+            raise HTTPException(status_code=400, detail=reservation.failures)
+
+        # 3️⃣ Preparar payload para /payments
+        payload = {
+            "account_uuid": account_uuid,
+            "amount": total,
+            "description": "Compra en eShop"
+        }
+
+        if before_payment is not None:
+            try:
+                await before_payment()
+            except BaseException:
+                # El cobro no se envió: el stock vuelve a estar disponible
+                with anyio.CancelScope(shield=True):
+                    await run_in_threadpool(release_stock, db, reservation)
+                raise
+
+        logger.debug(f"Enviando pago de {total} para el usuario {user.user_uuid}")
+
+        # Solo un rechazo definitivo (un 200 no aprobado o un 4xx) devuelve el stock.
+        # Con un timeout, un error de conexión, un 5xx o una cancelación el cobro
+        # pudo hacerse: la reserva se conserva y queda en el log para conciliarla
+        try:
+            with timed(timings, "payment"):
+                payment_response = await _post_to_gateway("/payments/", payload)
+            data = None
+            if payment_response.status_code == 200:
+                try:
+                    data = payment_response.json()
+                except ValueError:
+                    raise HTTPException(status_code=502, detail="Respuesta inválida del servicio de pagos")
+            elif not 400 <= payment_response.status_code < 500:
+                logger.warning(f"El servicio de pagos respondió {payment_response.status_code} al cobro")
+                raise HTTPException(status_code=502, detail="El servicio de pagos no confirmó el cobro")
+        except BaseException:
+            _log_unknown_payment(user, total, reservation)
+            raise
 
-    clear_cart(user_uuid=user.user_uuid, db=db)
+        if data is None or data.get("status") != "aprobado":
+            # Protegido de la cancelación para no perder la reserva si el cliente se desconecta
+            with anyio.CancelScope(shield=True):
+                await run_in_threadpool(release_stock, db, reservation)
+            if data is None:
+                raise HTTPException(status_code=400, detail="Error procesando el pago")
+            raise HTTPException(status_code=400, detail="Pago rechazado")
 
+        # 4️⃣ Limpiar carrito tras pago exitoso. El cobro ya está hecho: si falla,
+        # la compra sigue siendo correcta y el carrito se revisa a mano
+        try:
+            with timed(timings, "cart_clear"):
+                with anyio.CancelScope(shield=True):
+                    await run_in_threadpool(_clear_after_payment, user.user_uuid, db)
+        except Exception:
+            logger.exception(
+                f"Pago aprobado de {total} para el usuario {user.user_uuid}, "
+                f"pero no se pudo vaciar el carrito"
+            )
+    finally:
+        timings["total"] = time.perf_counter() - start
+        checkout_timings.record_all(timings)
+
+    # 5️⃣ Productos comprados
     return {
         "message": "Pago procesado exitosamente",
         "total": total,
         "items": purchased_items
-    }
\ No newline at end of file
+    }
+
+
+async def process_checkout_once(
+    user: User,
+    card_data: dict,
+    db: Session,
+    idempotency_key: Optional[str],
+    path: str,
+    timings: Optional[Dict[str, float]] = None,
+):
+    """
+    process_checkout con Idempotency-Key: un reintento con la misma clave recibe
+    la respuesta ya guardada sin volver a validar, cobrar ni vaciar el carrito.
+    Si falla antes del cobro la clave se libera; si falla o se cancela durante
+    el cobro, los reintentos reciben el resultado desconocido en vez de cobrar
+    otra vez. Sin clave se comporta como process_checkout.
+    """
+    if not idempotency_key:
+        return await process_checkout(user, card_data, db, timings=timings)
+    return await idempotency_store.run(
+        user.user_uuid,
+        idempotency_key,
+        request_fingerprint("POST", path, card_data),
+        lambda mark_started: process_checkout(user, card_data, db, timings=timings, before_payment=mark_started),
+    )
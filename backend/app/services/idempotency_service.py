@@ -0,0 +1,335 @@
+# app/services/idempotency_service.py
+import asyncio
+import hashlib
+import hmac
+import json
+import threading
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+import anyio
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import and_, or_
+from sqlalchemy.exc import IntegrityError
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.logger import logger
+from app.core.security import SECRET_KEY
+from app.core.time_utils import utc_now
+from app.models.idempotency_key import IdempotencyKey
+
+IN_PROGRESS = "in_progress"
+# La operación ya empezó su efecto externo (p. ej. el cobro): no se puede repetir
+STARTED = "started"
+COMPLETED = "completed"
+
+# Respuesta que se guarda cuando falla o se cancela una operación ya empezada
+OUTCOME_UNKNOWN_DETAIL = (
+    "No se pudo confirmar el resultado de la operación; queda pendiente de conciliación "
+    "y no se repetirá con esta Idempotency-Key"
+)
+
+# Cada cuántas claves nuevas se borran las caducadas
+PURGE_EVERY = 500
+
+
+def request_fingerprint(method: str, path: str, body: Any) -> str:
+    """
+    Huella de la petición: la misma clave con otro cuerpo u otro endpoint es un
+    error del cliente. HMAC con la clave de la app: el cuerpo lleva datos de
+    tarjeta y la huella no debe permitir adivinarlos.
+    """
+    payload = json.dumps({"method": method, "path": path, "body": jsonable_encoder(body)}, sort_keys=True)
+    return hmac.new(SECRET_KEY.encode("utf-8"), payload.encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+@dataclass
+class _StoredKey:
+    fingerprint: str
+    status: str
+    response_status: Optional[int]
+    response_body: Optional[str]
+
+
+class IdempotencyStore:
+    """
+    Ejecuta una operación como mucho una vez por (usuario, Idempotency-Key).
+
+    La primera petición reserva la clave (INSERT; la clave primaria impide dos
+    reservas), ejecuta la operación y guarda la respuesta. Un reintento con la
+    respuesta ya guardada la recibe tal cual, sin volver a ejecutar nada. Un
+    duplicado que llega mientras la primera sigue en curso espera a que termine:
+    en el mismo worker con un asyncio.Event, entre workers consultando la tabla.
+
+    Se guardan las respuestas correctas y los errores < 500 (tarjeta inválida,
+    pago rechazado, sin stock). La operación recibe mark_started y lo espera
+    justo antes de su efecto externo (el POST del cobro). Un error 5xx o una
+    cancelación antes de ese punto borra la clave y el cliente puede reintentar
+    con la misma clave; después, el resultado es desconocido y se guarda una
+    respuesta final (OUTCOME_UNKNOWN_DETAIL) que reciben los reintentos.
+    """
+
+    def __init__(
+        self,
+        ttl: float,
+        in_progress_timeout: float,
+        wait_timeout: float,
+        poll_interval: float,
+    ):
+        self.ttl = ttl
+        self.in_progress_timeout = in_progress_timeout
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+        self._inflight: Dict[Tuple[Any, str], asyncio.Event] = {}
+        self._lock = threading.Lock()
+        self.claims = 0
+        self.replays = 0
+        self.waits = 0
+        self.mismatches = 0
+        self.released = 0
+        self.unknown_outcomes = 0
+
+    # --- base de datos (se ejecuta en el threadpool, cada llamada con su sesión) ---
+    def _claim(self, user_uuid, key: str, fingerprint: str) -> Optional[_StoredKey]:
+        """Reserva la clave; devuelve None si la reservó esta petición o la fila existente."""
+        db = SessionLocal()
+        try:
+            now = utc_now()
+            abandoned = now - timedelta(seconds=self.in_progress_timeout)
+            # Una operación empezada por un proceso caído no se repite: se da por desconocida
+            if db.query(IdempotencyKey).filter(
+                IdempotencyKey.user_uuid == user_uuid,
+                IdempotencyKey.key == key,
+                IdempotencyKey.status == STARTED,
+                IdempotencyKey.created_at < abandoned,
+            ).update(self._unknown_outcome_values(502), synchronize_session=False):
+                db.commit()
+                self._count("unknown_outcomes")
+            # Claves caducadas o abandonadas antes de empezar se pueden reutilizar
+            db.query(IdempotencyKey).filter(
+                IdempotencyKey.user_uuid == user_uuid,
+                IdempotencyKey.key == key,
+                or_(
+                    and_(IdempotencyKey.status == COMPLETED, IdempotencyKey.created_at < now - timedelta(seconds=self.ttl)),
+                    and_(
+                        IdempotencyKey.status == IN_PROGRESS,
+                        IdempotencyKey.created_at < abandoned,
+                    ),
+                ),
+            ).delete(synchronize_session=False)
+            db.add(IdempotencyKey(user_uuid=user_uuid, key=key, request_fingerprint=fingerprint, status=IN_PROGRESS, created_at=now))
+            try:
+                db.commit()
+                return None
+            except IntegrityError:
+                db.rollback()
+
+            row = db.query(IdempotencyKey).filter(IdempotencyKey.user_uuid == user_uuid, IdempotencyKey.key == key).first()
+            if row is None:
+                # La primera ejecución falló y liberó la clave entretanto: se reintenta la reserva
+                return _StoredKey(fingerprint, IN_PROGRESS, None, None)
+            return _StoredKey(row.request_fingerprint, row.status, row.response_status, row.response_body)
+        finally:
+            db.close()
+
+    @staticmethod
+    def _completed_values(status_code: int, body: Any) -> Dict:
+        return {
+            "status": COMPLETED,
+            "response_status": status_code,
+            "response_body": json.dumps(jsonable_encoder(body)),
+            "completed_at": utc_now(),
+        }
+
+    @classmethod
+    def _unknown_outcome_values(cls, status_code: int) -> Dict:
+        return cls._completed_values(status_code, {"detail": OUTCOME_UNKNOWN_DETAIL})
+
+    def _complete(self, user_uuid, key: str, status_code: int, body: Any):
+        db = SessionLocal()
+        try:
+            db.query(IdempotencyKey).filter(IdempotencyKey.user_uuid == user_uuid, IdempotencyKey.key == key).update(
+                self._completed_values(status_code, body),
+                synchronize_session=False,
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    def _mark_started(self, user_uuid, key: str):
+        db = SessionLocal()
+        try:
+            db.query(IdempotencyKey).filter(
+                IdempotencyKey.user_uuid == user_uuid, IdempotencyKey.key == key, IdempotencyKey.status == IN_PROGRESS
+            ).update({"status": STARTED}, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def _release(self, user_uuid, key: str):
+        db = SessionLocal()
+        try:
+            db.query(IdempotencyKey).filter(
+                IdempotencyKey.user_uuid == user_uuid, IdempotencyKey.key == key, IdempotencyKey.status == IN_PROGRESS
+            ).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def purge_expired(self) -> int:
+        db = SessionLocal()
+        try:
+            deleted = db.query(IdempotencyKey).filter(
+                IdempotencyKey.status == COMPLETED,
+                IdempotencyKey.created_at < utc_now() - timedelta(seconds=self.ttl),
+            ).delete(synchronize_session=False)
+            db.commit()
+            return deleted
+        finally:
+            db.close()
+
+    # --- flujo ---
+    async def run(
+        self,
+        user_uuid,
+        key: str,
+        fingerprint: str,
+        operation: Callable[[Callable[[], Awaitable[None]]], Awaitable[Any]],
+    ) -> Any:
+        """
+        Devuelve el resultado de operation(mark_started) o, si la clave ya tiene
+        respuesta, un JSONResponse con la respuesta guardada (cabecera
+        Idempotent-Replayed).
+        """
+        deadline = time.monotonic() + self.wait_timeout
+        waited = False
+        while True:
+            stored = await run_in_threadpool(self._claim, user_uuid, key, fingerprint)
+            if stored is None:
+                return await self._execute(user_uuid, key, operation)
+
+            if stored.fingerprint != fingerprint:
+                self._count("mismatches")
+                raise HTTPException(
+                    status_code=422,
+                    detail="La Idempotency-Key ya se usó con una petición distinta",
+                )
+            if stored.status == COMPLETED:
+                self._count("replays")
+                return JSONResponse(
+                    status_code=stored.response_status,
+                    content=json.loads(stored.response_body),
+                    headers={"Idempotent-Replayed": "true"},
+                )
+
+            # En curso: esperar a la primera ejecución
+            if not waited:
+                waited = True
+                self._count("waits")
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise HTTPException(
+                    status_code=409,
+                    detail="Hay una petición en curso con esta Idempotency-Key; reintenta más tarde",
+                )
+            event = self._inflight.get((user_uuid, key))
+            if event is not None:
+                try:
+                    await asyncio.wait_for(event.wait(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    pass
+            else:
+                await asyncio.sleep(min(self.poll_interval, remaining))
+
+    async def _execute(
+        self, user_uuid, key: str, operation: Callable[[Callable[[], Awaitable[None]]], Awaitable[Any]]
+    ) -> Any:
+        self._count("claims")
+        if self.claims % PURGE_EVERY == 0:
+            await run_in_threadpool(self.purge_expired)
+
+        started = False
+
+        async def mark_started():
+            nonlocal started
+            # Protegido: si la marca llega a la base, el efecto se da por empezado
+            with anyio.CancelScope(shield=True):
+                await run_in_threadpool(self._mark_started, user_uuid, key)
+            started = True
+
+        event = self._inflight[(user_uuid, key)] = asyncio.Event()
+        try:
+            try:
+                result = await operation(mark_started)
+            except HTTPException as e:
+                if e.status_code < 500:
+                    await run_in_threadpool(self._complete, user_uuid, key, e.status_code, {"detail": e.detail})
+                    raise
+                if not started:
+                    await self._release_shielded(user_uuid, key)
+                    raise
+                await self._complete_unknown_shielded(user_uuid, key, e.status_code)
+                raise HTTPException(status_code=e.status_code, detail=OUTCOME_UNKNOWN_DETAIL) from e
+            except BaseException:
+                if started:
+                    await self._complete_unknown_shielded(user_uuid, key, 502)
+                else:
+                    await self._release_shielded(user_uuid, key)
+                raise
+            await run_in_threadpool(self._complete, user_uuid, key, 200, result)
+            return result
+        finally:
+            self._inflight.pop((user_uuid, key), None)
+            event.set()
+
+    async def _release_shielded(self, user_uuid, key: str):
+        self._count("released")
+        try:
+            with anyio.CancelScope(shield=True):
+                await run_in_threadpool(self._release, user_uuid, key)
+        except Exception:
+            # Si no se puede borrar, la clave caduca tras in_progress_timeout
+            logger.exception(f"No se pudo liberar la Idempotency-Key {key}")
+
+    async def _complete_unknown_shielded(self, user_uuid, key: str, status_code: int):
+        self._count("unknown_outcomes")
+        logger.error(f"Resultado desconocido con la Idempotency-Key {key} (usuario {user_uuid}): pendiente de conciliación")
+        try:
+            with anyio.CancelScope(shield=True):
+                await run_in_threadpool(
+                    self._complete, user_uuid, key, status_code, {"detail": OUTCOME_UNKNOWN_DETAIL}
+                )
+        except Exception:
+            # La clave sigue "started": _claim la da por desconocida tras in_progress_timeout
+            logger.exception(f"No se pudo guardar el resultado desconocido de la Idempotency-Key {key}")
+
+    def _count(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "in_flight": len(self._inflight),
+                "claims": self.claims,
+                "replays": self.replays,
+                "waits": self.waits,
+                "mismatches": self.mismatches,
+                "released": self.released,
+                "unknown_outcomes": self.unknown_outcomes,
+            }
+
+
+# Instancia global
+idempotency_store = IdempotencyStore(
+    ttl=settings.idempotency_key_ttl_seconds,
+    in_progress_timeout=settings.idempotency_in_progress_timeout_seconds,
+    wait_timeout=settings.idempotency_wait_timeout_seconds,
+    poll_interval=settings.idempotency_poll_interval_seconds,
+)
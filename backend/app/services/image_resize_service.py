@@ -0,0 +1,133 @@
+# app/services/image_resize_service.py
+import hashlib
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import FrozenSet, Optional, Union
+from urllib.parse import urlsplit
+from uuid import UUID
+
+import requests
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.disk_cache import DiskLRUCache
+from app.core.storage import STATIC_DIR, LocalContentAddressedStorage, get_image_storage
+from app.models.product import Product
+from app.services.image_variants import render_variant
+
+MASTER_FETCH_TIMEOUT_SECONDS = 10
+FETCH_CHUNK_SIZE = 64 * 1024
+
+
+class ImageFetchError(OSError):
+    """No se puede (o no se debe) descargar la imagen original."""
+
+
+@lru_cache()
+def get_variant_cache() -> DiskLRUCache:
+    """Cache en disco de los tamaños generados a demanda (compartida por los workers del host)."""
+    root = settings.image_variant_cache_dir or STATIC_DIR.parent / ".image_cache"
+    return DiskLRUCache(Path(root), settings.image_variant_cache_max_bytes, suffix=".webp")
+
+
+@lru_cache()
+def allowed_master_hosts() -> FrozenSet[str]:
+    """Hosts desde los que se descargan originales: los configurados y el del backend local."""
+    hosts = {host.strip().lower() for host in settings.image_master_allowed_hosts.split(",") if host.strip()}
+    public_host = urlsplit(settings.public_base_url).hostname
+    if public_host:
+        hosts.add(public_host.lower())
+    return frozenset(hosts)
+
+
+def fetch_remote_master(url: str) -> bytes:
+    """
+    Descarga un original remoto solo desde un host permitido, sin seguir
+    redirecciones y cortando la descarga al pasar de max_image_upload_bytes
+    o de MASTER_FETCH_TIMEOUT_SECONDS en total.
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or (parts.hostname or "").lower() not in allowed_master_hosts():
+        raise ImageFetchError(f"Host no permitido para la imagen original: {parts.hostname}")
+
+    max_bytes = settings.max_image_upload_bytes
+    deadline = time.monotonic() + MASTER_FETCH_TIMEOUT_SECONDS
+    with requests.get(url, stream=True, allow_redirects=False, timeout=MASTER_FETCH_TIMEOUT_SECONDS) as response:
+        response.raise_for_status()
+        if response.status_code != 200:
+            raise ImageFetchError(f"Respuesta inesperada ({response.status_code}) al descargar la imagen original")
+        declared = response.headers.get("Content-Length")
+        if declared and declared.isdigit() and int(declared) > max_bytes:
+            raise ImageFetchError("La imagen original es demasiado grande")
+
+        data = bytearray()
+        for chunk in response.iter_content(FETCH_CHUNK_SIZE):
+            data += chunk
+            if len(data) > max_bytes:
+                raise ImageFetchError("La imagen original es demasiado grande")
+            if time.monotonic() > deadline:
+                raise ImageFetchError("La descarga de la imagen original tardó demasiado")
+    return bytes(data)
+
+
+def load_master(url: str) -> Union[str, bytes]:
+    """
+    Devuelve la imagen original como ruta local (si está en disco) o como bytes.
+    Acepta URLs del almacenamiento local, rutas /static/... heredadas y URLs
+    remotas de los hosts permitidos (ver fetch_remote_master).
+    """
+    storage = get_image_storage()
+    if isinstance(storage, LocalContentAddressedStorage):
+        path = storage.path_for(url)
+        if path is not None:
+            return str(path)
+
+    if url.startswith("/static/"):
+        path = (STATIC_DIR / url[len("/static/"):]).resolve()
+        if STATIC_DIR.resolve() not in path.parents:
+            raise FileNotFoundError(url)
+        return str(path)
+
+    return fetch_remote_master(url)
+
+
+@dataclass
+class ImageVariant:
+    """Tamaño pedido de la imagen de un producto: clave de la cache, ETag y URL del master."""
+
+    key: str
+    etag: str
+    master_url: str
+
+
+def resolve_image_variant(db: Session, product_id: UUID, width: int, height: int) -> Optional[ImageVariant]:
+    """
+    Clave y ETag de la variante sin generarla, o None si el producto no tiene
+    imagen. La clave incluye la URL del master: al cambiar la imagen, las
+    variantes anteriores dejan de usarse y la LRU las expulsa.
+    """
+    row = (
+        db.query(Product.image_master, Product.image_medium)
+        .filter(Product.id == product_id, Product.is_active == True)
+        .first()
+    )
+    if row is None:
+        return None
+    master_url = row.image_master or row.image_medium
+    if not master_url:
+        return None
+
+    master_hash = hashlib.sha1(master_url.encode("utf-8")).hexdigest()[:16]
+    key = f"{product_id}:{master_hash}:{width}x{height}"
+    etag = f'"{hashlib.sha1(key.encode("utf-8")).hexdigest()[:20]}"'
+    return ImageVariant(key, etag, master_url)
+
+
+def render_image_variant(variant: ImageVariant, width: int, height: int) -> bytes:
+    """WebP de la variante: de la cache en disco o generado a partir del master."""
+    return get_variant_cache().get_or_create(
+        variant.key, lambda: render_variant(load_master(variant.master_url), width, height)
+    )
+
@@ -0,0 +1,121 @@
+# app/services/image_variants.py
+import io
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import BinaryIO, Dict, Optional, Tuple, Union
+
+from PIL import Image
+
+# -------------------------
+# Tamaños de imagen
+# -------------------------
+IMAGE_SIZES = {
+    "small": (100, 100),
+    "thumbnail": (200, 200),
+    "medium": (800, 800)
+}
+
+WEBP_QUALITY = 80
+
+# Original normalizado del que se generan tamaños a demanda (/images/...)
+MASTER_SIZE = (2048, 2048)
+MASTER_QUALITY = 90
+
+# reduce() entero antes del remuestreo final: mucho más rápido en fotos grandes
+# con una diferencia de calidad imperceptible a partir de 2.0
+REDUCING_GAP = 2.0
+
+ImageSource = Union[bytes, str, BinaryIO]
+
+_pool_lock = threading.Lock()
+_encode_pool: Optional[ProcessPoolExecutor] = None
+
+
+def encode_webp(image: Image.Image, quality: int = WEBP_QUALITY) -> bytes:
+    """Codifica una imagen a WebP. Se ejecuta en el pool de procesos (debe ser picklable)."""
+    buffer = io.BytesIO()
+    image.save(buffer, format="WEBP", quality=quality, optimize=True)
+    return buffer.getvalue()
+
+
+def _get_encode_pool() -> Optional[ProcessPoolExecutor]:
+    """Pool de procesos para la codificación WebP (None si está desactivado)."""
+    global _encode_pool
+    from app.core.config import settings
+
+    if settings.image_encode_workers <= 0:
+        return None
+    with _pool_lock:
+        if _encode_pool is None:
+            # spawn: el proceso web tiene hilos activos y fork no es seguro con ellos
+            _encode_pool = ProcessPoolExecutor(
+                max_workers=settings.image_encode_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _encode_pool
+
+
+def shutdown_encode_pool():
+    global _encode_pool
+    with _pool_lock:
+        pool, _encode_pool = _encode_pool, None
+    if pool is not None:
+        pool.shutdown(wait=True)
+
+
+def resize_variants(source: ImageSource, sizes: Dict[str, Tuple[int, int]] = IMAGE_SIZES) -> Dict[str, Image.Image]:
+    """
+    Decodifica la imagen una sola vez y genera los tamaños en cascada
+    (medium -> thumbnail -> small), cada uno a partir del anterior.
+    En JPEG, draft() decodifica directamente a 1/2, 1/4 o 1/8 de resolución
+    si basta para el tamaño mayor, sin materializar la foto completa.
+    """
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    image = Image.open(source)
+
+    ordered = sorted(sizes.items(), key=lambda item: item[1][0] * item[1][1], reverse=True)
+    image.draft("RGB", ordered[0][1])
+    current = image.convert("RGB")
+    image.close()
+
+    variants = {}
+    for index, (size_name, size) in enumerate(ordered):
+        if index:
+            current = current.copy()
+        current.thumbnail(size, reducing_gap=REDUCING_GAP)
+        variants[size_name] = current
+    return variants
+
+
+def generate_variants(
+    source: ImageSource,
+    sizes: Dict[str, Tuple[int, int]] = IMAGE_SIZES,
+    quality: int = WEBP_QUALITY,
+    qualities: Optional[Dict[str, int]] = None,
+) -> Dict[str, bytes]:
+    """
+    Devuelve {tamaño: bytes WebP}.
+    Los redimensionados ocurren aquí; la codificación WebP, en paralelo en el pool de procesos.
+    qualities permite otra calidad para tamaños concretos (p. ej. el master).
+    """
+    variants = resize_variants(source, sizes)
+    qualities = qualities or {}
+    pool = _get_encode_pool()
+    if pool is None:
+        return {
+            size_name: encode_webp(image, qualities.get(size_name, quality))
+            for size_name, image in variants.items()
+        }
+
+    futures = {
+        size_name: pool.submit(encode_webp, image, qualities.get(size_name, quality))
+        for size_name, image in variants.items()
+    }
+    return {size_name: future.result() for size_name, future in futures.items()}
+
+
+def render_variant(source: ImageSource, width: int, height: int, quality: int = WEBP_QUALITY) -> bytes:
+    """Un único tamaño (cabe en width x height, sin ampliar) codificado en WebP."""
+    return generate_variants(source, {"custom": (width, height)}, quality)["custom"]
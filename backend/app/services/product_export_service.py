@@ -0,0 +1,79 @@
+# app/services/product_export_service.py
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Iterator, Optional
+from uuid import UUID
+
+from sqlalchemy import select
+
+from app.core.database import SessionLocal
+from app.models.product import Product
+
+EXPORT_FORMATS = ("ndjson", "csv")
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+EXPORT_COLUMNS = (
+    "id", "name", "description", "price", "stock", "is_active",
+    "image_small", "image_thumbnail", "image_medium", "version", "updated_at",
+)
+DEFAULT_BATCH_SIZE = 1000
+
+
+def _json_default(value):
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Tipo no serializable: {type(value).__name__}")
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def iter_product_export(
+    fmt: str,
+    updated_since: Optional[datetime] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> Iterator[bytes]:
+    """
+    Genera el catálogo completo (incluye inactivos, para propagar bajas) en NDJSON o CSV.
+    Lee con un cursor del lado del servidor (yield_per): la memoria no depende del
+    tamaño del catálogo y el primer bloque sale en cuanto llega el primer lote.
+    Abre su propia sesión porque se consume después de que el endpoint retorna.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Formato no soportado: {fmt}")
+
+    columns = [Product.__table__.c[name] for name in EXPORT_COLUMNS]
+    stmt = select(*columns)
+    if updated_since is not None:
+        stmt = stmt.where(Product.updated_at >= updated_since)
+
+    if fmt == "csv":
+        header = io.StringIO()
+        csv.writer(header).writerow(EXPORT_COLUMNS)
+        yield header.getvalue().encode("utf-8")
+
+    db = SessionLocal()
+    try:
+        result = db.execute(stmt.execution_options(yield_per=batch_size))
+        for rows in result.partitions():
+            if fmt == "ndjson":
+                chunk = "".join(
+                    json.dumps(dict(zip(EXPORT_COLUMNS, row)), default=_json_default, ensure_ascii=False) + "\n"
+                    for row in rows
+                )
+            else:
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                writer.writerows([_csv_value(value) for value in row] for row in rows)
+                chunk = buffer.getvalue()
+            yield chunk.encode("utf-8")
+    finally:
+        db.close()
@@ -0,0 +1,282 @@
+# app/services/product_import_service.py
+import csv
+import json
+from typing import BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
+from uuid import UUID, uuid4
+
+from pydantic import ValidationError
+from sqlalchemy import case, func, insert
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app.core.logger import logger
+from app.core.time_utils import utc_now
+from app.models.product import Product
+from app.schemas.product_schema import ProductCreate
+from app.services.cart_summary import refresh_cart_summaries_for_products
+from app.services.product_service import invalidate_catalog_cache
+
+IMPORT_FORMATS = ("csv", "ndjson")
+DEFAULT_CHUNK_SIZE = 500
+
+# Máximo de errores detallados en la respuesta (el total siempre se cuenta)
+MAX_REPORTED_ERRORS = 1000
+
+# Columnas que se sobrescriben en un upsert por id
+_UPSERT_COLUMNS = ("name", "description", "price", "stock", "is_active")
+# Las imágenes solo se reemplazan si la fila trae una nueva
+_UPSERT_IMAGE_COLUMNS = ("image_small", "image_thumbnail", "image_medium")
+
+
+def detect_format(filename: Optional[str], content_type: Optional[str] = None) -> Optional[str]:
+    """Deduce el formato a partir de la extensión o del content-type."""
+    name = (filename or "").lower()
+    if name.endswith(".csv") or content_type == "text/csv":
+        return "csv"
+    if name.endswith((".ndjson", ".jsonl")) or content_type in ("application/x-ndjson", "application/jsonl"):
+        return "ndjson"
+    return None
+
+
+class _DecodedLines:
+    """
+    Líneas del archivo decodificadas una a una como UTF-8. Una línea inválida
+    lanza UnicodeDecodeError pero el iterador sigue con la siguiente, así que
+    un byte corrupto solo afecta a su fila.
+    """
+
+    def __init__(self, stream: BinaryIO):
+        self._lines = iter(stream)
+        self.line_number = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        raw_line = next(self._lines)
+        self.line_number += 1
+        return raw_line.decode("utf-8-sig" if self.line_number == 1 else "utf-8")
+
+
+def _iter_csv_rows(stream: BinaryIO) -> Iterator[Tuple[int, object]]:
+    lines = _DecodedLines(stream)
+    reader = csv.DictReader(lines)
+    while True:
+        try:
+            row = next(reader)
+        except StopIteration:
+            return
+        except UnicodeDecodeError:
+            yield lines.line_number, ValueError("la línea no es UTF-8 válido")
+            continue
+        except csv.Error as e:
+            # El lector empieza un registro nuevo en la línea siguiente
+            yield lines.line_number, e
+            continue
+        # Las celdas vacías equivalen a "no enviado"
+        yield lines.line_number, {key: (value if value != "" else None) for key, value in row.items() if key}
+
+
+def _iter_ndjson_rows(stream: BinaryIO) -> Iterator[Tuple[int, object]]:
+    lines = _DecodedLines(stream)
+    while True:
+        try:
+            line = next(lines)
+        except StopIteration:
+            return
+        except UnicodeDecodeError:
+            yield lines.line_number, ValueError("la línea no es UTF-8 válido")
+            continue
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError as e:
+            yield lines.line_number, e
+            continue
+        if not isinstance(data, dict):
+            yield lines.line_number, ValueError("Se esperaba un objeto JSON por línea")
+            continue
+        yield lines.line_number, data
+
+
+def iter_import_rows(stream: BinaryIO, fmt: str) -> Iterator[Tuple[int, object]]:
+    """
+    Lee el archivo fila a fila sin cargarlo entero en memoria.
+    Devuelve (número de fila, dict) o (número de fila, excepción) si la fila no
+    se pudo leer (UTF-8 inválido, CSV o JSON mal formado); la lectura sigue con
+    la fila siguiente.
+    """
+    if fmt == "csv":
+        return _iter_csv_rows(stream)
+    if fmt == "ndjson":
+        return _iter_ndjson_rows(stream)
+    raise ValueError(f"Formato no soportado: {fmt}")
+
+
+def _validation_message(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(loc) for loc in item['loc']) or 'fila'}: {item['msg']}" for item in error.errors()
+    )
+
+
+def _row_to_values(data: dict) -> Tuple[Dict, bool, Optional[str]]:
+    """
+    Valida una fila contra ProductCreate.
+    Devuelve (valores para la tabla, si trae id propio, imagen base64 pendiente).
+    """
+    data = dict(data)
+    raw_id = data.pop("id", None)
+    product_in = ProductCreate.model_validate(data)
+    values = {
+        "id": UUID(str(raw_id)) if raw_id else uuid4(),
+        "name": product_in.name,
+        "description": product_in.description,
+        "price": product_in.price,
+        "stock": product_in.stock,
+        "is_active": product_in.is_active if product_in.is_active is not None else True,
+        "image_small": product_in.image_url,
+        "image_thumbnail": product_in.image_url,
+        "image_medium": product_in.image_url,
+    }
+    return values, raw_id is not None, product_in.image_base64
+
+
+def _upsert_statement(db: Session):
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        stmt = postgresql.insert(Product)
+    elif dialect == "sqlite":
+        stmt = sqlite.insert(Product)
+    else:
+        raise ValueError(f"Upsert por id no soportado en {dialect}")
+    update = {column: stmt.excluded[column] for column in _UPSERT_COLUMNS}
+    for column in _UPSERT_IMAGE_COLUMNS:
+        update[column] = func.coalesce(stmt.excluded[column], getattr(Product, column))
+    # Una imagen nueva por URL invalida el master anterior
+    update["image_master"] = case((stmt.excluded["image_medium"].is_(None), Product.image_master), else_=None)
+    update["version"] = Product.version + 1
+    update["updated_at"] = utc_now()
+    return stmt.on_conflict_do_update(index_elements=[Product.id], set_=update)
+
+
+class ProductImporter:
+    """
+    Importa productos en bloques: valida cada bloque contra ProductCreate y lo
+    escribe con un INSERT multi-fila (o upsert si la fila trae id) y un solo commit.
+    Las filas inválidas o ilegibles se reportan sin abortar la importación.
+    """
+
+    def __init__(
+        self,
+        db: Session,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        defer_image: Optional[Callable[[str, str], None]] = None,
+    ):
+        self.db = db
+        self.chunk_size = chunk_size
+        self.defer_image = defer_image
+        self.processed = 0
+        self.inserted = 0
+        self.updated = 0
+        self.images_deferred = 0
+        self.failed = 0
+        self.errors: List[Dict] = []
+
+    def _error(self, row_number: int, message: str):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row_number, "error": message})
+
+    def run(self, stream: BinaryIO, fmt: str) -> Dict:
+        chunk: List[Tuple[int, Dict, bool, Optional[str]]] = []
+        for row_number, data in iter_import_rows(stream, fmt):
+            self.processed += 1
+            if isinstance(data, Exception):
+                self._error(row_number, f"Fila ilegible: {data}")
+                continue
+            try:
+                values, has_id, image_base64 = _row_to_values(data)
+            except ValidationError as e:
+                self._error(row_number, _validation_message(e))
+                continue
+            except ValueError as e:
+                self._error(row_number, f"id: {e}")
+                continue
+
+            chunk.append((row_number, values, has_id, image_base64))
+            if len(chunk) >= self.chunk_size:
+                self._flush(chunk)
+                chunk = []
+        if chunk:
+            self._flush(chunk)
+
+        if self.inserted or self.updated:
+            invalidate_catalog_cache()
+        return self.result()
+
+    def _write(self, rows: List[Tuple[int, Dict, bool, Optional[str]]]) -> int:
+        """Escribe un bloque; devuelve cuántas filas ya existían (actualizadas)."""
+        new_rows = [values for _, values, has_id, _ in rows if not has_id]
+        upsert_rows = [values for _, values, has_id, _ in rows if has_id]
+
+        existing = 0
+        if upsert_rows:
+            ids = [values["id"] for values in upsert_rows]
+            existing = self.db.query(Product.id).filter(Product.id.in_(ids)).count()
+            self.db.execute(_upsert_statement(self.db), upsert_rows)
+            if existing:
+                # Los precios pueden haber cambiado: se recalculan los carritos afectados
+                refresh_cart_summaries_for_products(self.db, ids)
+        if new_rows:
+            self.db.execute(insert(Product), new_rows)
+        self.db.commit()
+        return existing
+
+    def _flush(self, rows: List[Tuple[int, Dict, bool, Optional[str]]]):
+        try:
+            existing = self._write(rows)
+            written = rows
+            self.updated += existing
+            self.inserted += len(rows) - existing
+        except SQLAlchemyError as e:
+            self.db.rollback()
+            logger.warning(f"Bloque de importación rechazado ({e.__class__.__name__}); reintentando fila a fila")
+            written = []
+            for row in rows:
+                try:
+                    existing = self._write([row])
+                    written.append(row)
+                    self.updated += existing
+                    self.inserted += 1 - existing
+                except SQLAlchemyError as row_error:
+                    self.db.rollback()
+                    self._error(row[0], str(row_error.orig if hasattr(row_error, "orig") else row_error))
+
+        # Las imágenes se procesan después del commit, fuera de este flujo
+        for _, values, _, image_base64 in written:
+            if image_base64 and self.defer_image:
+                self.defer_image(str(values["id"]), image_base64)
+                self.images_deferred += 1
+
+    def result(self) -> Dict:
+        return {
+            "processed": self.processed,
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "failed": self.failed,
+            "images_deferred": self.images_deferred,
+            "errors": self.errors,
+        }
+
+
+def import_products(
+    db: Session,
+    stream: BinaryIO,
+    fmt: str,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    defer_image: Optional[Callable[[str, str], None]] = None,
+) -> Dict:
+    """Importa un CSV/NDJSON de productos. Ver ProductImporter."""
+    return ProductImporter(db, chunk_size=chunk_size, defer_image=defer_image).run(stream, fmt)
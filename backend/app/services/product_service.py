@@ -2,130 +2,392 @@ import base64
 import io
 import os
 import logging
-from typing import List, Optional, Dict
-from uuid import uuid4
-from PIL import Image
+from pathlib import Path
+from typing import List, Optional, Dict, Tuple, Union
+import json
+import hashlib
+import math
+from datetime import datetime
+from uuid import uuid4, UUID
+from pydantic import TypeAdapter
+from sqlalchemy import tuple_, func
 from sqlalchemy.orm import Session
 from fastapi import HTTPException
-import cloudinary
-import cloudinary.uploader
-from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor
 
 from app.models.product import Product
 from app.models.cart import CartItem
-from app.schemas.product_schema import ProductCreate, ProductUpdate
+from app.schemas.product_schema import ProductCreate, ProductUpdate, ProductResponse
 from app.core.logger import logger
-
-load_dotenv()  # Cargar variables de entorno desde .env
+from app.core.cache import VersionedCache
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.jobs import Job, job_queue
+from app.core.storage import get_image_storage
+from app.services.cart_summary import apply_price_change
+from app.services.image_variants import IMAGE_SIZES, MASTER_QUALITY, MASTER_SIZE, generate_variants
 
 # Evita redefinir logger
 logger = logging.getLogger("eshop_logger")
 
-# Inicializar Cloudinary con variables de entorno
-cloudinary.config(
-    cloud_name=os.getenv("CLOUDINARY_CLOUD_NAME"),
-    api_key=os.getenv("CLOUDINARY_API_KEY"),
-    api_secret=os.getenv("CLOUDINARY_API_SECRET"),
-    secure=True
-)
-
 # -------------------------
-# Tamaños de imagen
+# Cache del catálogo público
 # -------------------------
-IMAGE_SIZES = {
-    "small": (100, 100),
-    "thumbnail": (200, 200),
-    "medium": (800, 800)
-}
+catalog_cache = VersionedCache(
+    maxsize=settings.catalog_cache_max_entries,
+    ttl=settings.catalog_cache_ttl_seconds
+)
 
-# -------------------------
-# Guardar imagenes en Cloudinary
-# -------------------------
-def save_product_images_cloudinary(base64_image: str, product_id: str) -> Dict[str, str]:
+_product_adapter = TypeAdapter(ProductResponse)
+_product_list_adapter = TypeAdapter(List[ProductResponse])
+
+
+def invalidate_catalog_cache() -> int:
+    """Incrementa la versión del catálogo. Llamar tras cualquier cambio en productos."""
+    return catalog_cache.bump()
+
+
+def get_catalog_json(
+    db: Session,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    sort: str = "name",
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    in_stock: bool = False,
+    name_prefix: Optional[str] = None,
+) -> Tuple[bytes, Optional[str]]:
+    """
+    Devuelve una página del listado público ya serializada a JSON y el cursor siguiente.
+    En un hit no se consulta la base de datos ni se valida cada fila de nuevo.
+    """
+    key = ("list", limit, cursor, sort, min_price, max_price, in_stock, name_prefix)
+    version = catalog_cache.version
+    cached = catalog_cache.get(key)
+    if cached is not None:
+        return cached
+
+    products, next_cursor = list_products_page(
+        db,
+        limit=limit,
+        cursor=cursor,
+        sort=sort,
+        min_price=min_price,
+        max_price=max_price,
+        in_stock=in_stock,
+        name_prefix=name_prefix,
+    )
+    body = _product_list_adapter.dump_json(
+        _product_list_adapter.validate_python(products, from_attributes=True)
+    )
+    catalog_cache.set(key, (body, next_cursor), version=version)
+    return body, next_cursor
+
+
+def get_catalog_etag(db: Session, **params) -> Tuple[str, Optional[datetime]]:
     """
-    Convierte base64 en imagen, genera los tamaños y sube a Cloudinary.
-    Devuelve URLs.
+    ETag fuerte y Last-Modified de una página del listado.
+    Se derivan de un agregado (count, suma de versiones, último updated_at),
+    sin leer ni serializar filas completas.
     """
-    image_data = base64.b64decode(base64_image)
-    image = Image.open(io.BytesIO(image_data)).convert("RGB")
+    key = ("list-etag",) + tuple(sorted(params.items()))
+    version = catalog_cache.version
+    cached = catalog_cache.get(key)
+    if cached is not None:
+        return cached
+
+    count, version_sum, last_modified = db.query(
+        func.count(Product.id),
+        func.coalesce(func.sum(Product.version), 0),
+        func.max(Product.updated_at),
+    ).one()
+    digest = hashlib.sha1(repr((key, count, version_sum, last_modified)).encode("utf-8")).hexdigest()
+    result = (f'"{digest[:32]}"', last_modified)
+    catalog_cache.set(key, result, version=version)
+    return result
+
 
-    urls = {}
-    for size_name, size in IMAGE_SIZES.items():
-        img_copy = image.copy()
-        img_copy.thumbnail(size)
+def get_product_etag(db: Session, product_id: str) -> Optional[Tuple[str, Optional[datetime]]]:
+    """ETag fuerte ("<id>-<version>") y Last-Modified de un producto, o None si no existe."""
+    key = ("detail-etag", product_id)
+    version = catalog_cache.version
+    cached = catalog_cache.get(key)
+    if cached is not None:
+        return cached
 
-        img_bytes = io.BytesIO()
-        img_copy.save(img_bytes, format="WEBP", quality=80, optimize=True)
-        img_bytes.seek(0)
+    row = db.query(Product.id, Product.version, Product.updated_at).filter(Product.id == product_id).first()
+    if not row:
+        return None
+    result = (f'"{row.id}-{row.version}"', row.updated_at)
+    catalog_cache.set(key, result, version=version)
+    return result
 
-        result = cloudinary.uploader.upload(
-            img_bytes,
-            folder="products",
-            public_id=f"{product_id}_{size_name}",
-            format="webp",
-            overwrite=True
-        )
-        urls[size_name] = result["secure_url"]
 
-    return urls
+def get_product_json(db: Session, product_id: str) -> Optional[bytes]:
+    """Igual que get_catalog_json pero para el detalle de un producto."""
+    key = ("detail", product_id)
+    version = catalog_cache.version
+    cached = catalog_cache.get(key)
+    if cached is not None:
+        return cached
 
-def _process_product_image(db: Session, product: Product, base64_image: str):
-    """Procesa y sube imágenes a Cloudinary para un producto."""
-    image_urls = save_product_images_cloudinary(base64_image, str(product.id))
+    product = get_product_by_id(db, product_id)
+    if not product:
+        return None
+    body = _product_adapter.dump_json(_product_adapter.validate_python(product, from_attributes=True))
+    catalog_cache.set(key, body, version=version)
+    return body
+
+# -------------------------
+# Guardar imágenes en el almacenamiento configurado
+# -------------------------
+def save_product_images(image_data: Union[bytes, str, Path], product_id: str) -> Dict[str, str]:
+    """
+    Genera los tamaños de la imagen (bytes o ruta a un archivo) y los guarda en el
+    backend configurado (Cloudinary o disco local direccionado por contenido). Devuelve URLs.
+    """
+    if isinstance(image_data, Path):
+        image_data = str(image_data)
+    # El master se guarda junto a los tamaños fijos para los tamaños a demanda
+    variants = generate_variants(
+        image_data,
+        sizes={**IMAGE_SIZES, "master": MASTER_SIZE},
+        qualities={"master": MASTER_QUALITY},
+    )
+    storage = get_image_storage()
+
+    # Las subidas remotas van en paralelo; en disco local son inmediatas
+    with ThreadPoolExecutor(max_workers=len(variants)) as executor:
+        futures = {
+            size_name: executor.submit(storage.save, webp_bytes, f"{product_id}_{size_name}", "image/webp")
+            for size_name, webp_bytes in variants.items()
+        }
+        return {size_name: future.result() for size_name, future in futures.items()}
+
+def _apply_image_urls(product: Product, image_urls: Dict[str, str]):
     product.image_small = image_urls["small"]
     product.image_thumbnail = image_urls["thumbnail"]
     product.image_medium = image_urls["medium"]
+    # Una URL externa no trae master: los tamaños a demanda usarán image_medium
+    product.image_master = image_urls.get("master")
+
+
+def process_product_image_job(
+    product_id: str,
+    base64_image: Optional[str] = None,
+    image_path: Optional[str] = None,
+) -> Optional[Dict[str, str]]:
+    """
+    Trabajo en segundo plano: genera las variantes, las sube y actualiza el producto.
+    La imagen llega en base64 o como ruta a un archivo subido por multipart.
+    Abre su propia sesión; las excepciones se propagan para que la cola reintente.
+    """
+    db = SessionLocal()
+    try:
+        product = get_product_by_id(db, product_id)
+        if not product:
+            logger.warning(f"Producto {product_id} no encontrado al procesar su imagen")
+            return None
+
+        source = Path(image_path) if image_path else base64.b64decode(base64_image)
+        image_urls = save_product_images(source, product_id)
+        _apply_image_urls(product, image_urls)
+        db.commit()
+        invalidate_catalog_cache()
+        logger.info(f"Imágenes generadas para el producto {product_id}")
+        return image_urls
+    finally:
+        db.close()
 
-    db.commit()
-    db.refresh(product)
+
+def enqueue_product_image(product_id: str, base64_image: str) -> Job:
+    """Encola el procesamiento de la imagen fuera del request."""
+    return job_queue.enqueue("product_image", process_product_image_job, product_id, base64_image)
+
+
+def _remove_spooled_image(job: Job):
+    Path(job.kwargs["image_path"]).unlink(missing_ok=True)
+
+
+def enqueue_product_image_file(product_id: str, image_path: Path) -> Job:
+    """
+    Encola una imagen ya volcada a disco (ver spool_image_upload).
+    El archivo temporal se borra cuando el trabajo termina, con éxito o no.
+    """
+    return job_queue.enqueue(
+        "product_image",
+        process_product_image_job,
+        product_id,
+        image_path=str(image_path),
+        on_done=_remove_spooled_image,
+    )
 
 # -------------------------
 # CRUD Productos
 # -------------------------
-def create_product(db: Session, product_in: ProductCreate) -> Product:
+def create_product(
+    db: Session, product_in: ProductCreate, image_path: Optional[Path] = None
+) -> Tuple[Product, Optional[str]]:
+    """
+    Crea el producto en un solo commit. La imagen (base64 o archivo ya volcado a
+    disco por una subida multipart) se procesa después en segundo plano.
+    Devuelve el producto y el id del trabajo de imagen (o None).
+    """
     product = Product(
         name=product_in.name,
         description=product_in.description,
         price=product_in.price,
         stock=product_in.stock,
         is_active=product_in.is_active if product_in.is_active is not None else True,
-        image_small=None,
-        image_thumbnail=None,
-        image_medium=None
+        image_small=product_in.image_url,
+        image_thumbnail=product_in.image_url,
+        image_medium=product_in.image_url
     )
     db.add(product)
     db.commit()
     db.refresh(product)
+    invalidate_catalog_cache()
 
-    # Guardar imagen base64 o asignar URL
-    if getattr(product_in, "image_base64", None):
-        _process_product_image(db, product, product_in.image_base64)
-    elif getattr(product_in, "image_url", None):
-        product.image_small = product_in.image_url
-        product.image_thumbnail = product_in.image_url
-        product.image_medium = product_in.image_url
-        db.commit()
-        db.refresh(product)
+    # La imagen base64 se procesa en segundo plano; el producto se actualiza al terminar
+    image_job_id = None
+    if image_path is not None:
+        image_job_id = enqueue_product_image_file(str(product.id), image_path).id
+    elif product_in.image_base64:
+        image_job_id = enqueue_product_image(str(product.id), product_in.image_base64).id
 
-    return product
+    return product, image_job_id
 
 def get_all_products(db: Session) -> List[Product]:
     return db.query(Product).filter(Product.is_active == True).all()
 
+# -------------------------
+# Listado paginado por cursor (keyset)
+# -------------------------
+# sort -> (columna, descendente)
+PRODUCT_SORTS = {
+    "name": (Product.name, False),
+    "-name": (Product.name, True),
+    "price": (Product.price, False),
+    "-price": (Product.price, True),
+}
+
+
+def _encode_cursor(sort: str, value, product_id) -> str:
+    raw = json.dumps([sort, value, str(product_id)]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _valid_cursor_value(sort: str, value) -> bool:
+    """El valor del cursor viene del cliente: debe ser del tipo de la columna de orden."""
+    column, _ = PRODUCT_SORTS[sort]
+    if column is Product.name:
+        return isinstance(value, str)
+    # bool es subclase de int, pero no es un precio
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+
+def _decode_cursor(cursor: str, sort: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        cursor_sort, value, product_id = json.loads(base64.urlsafe_b64decode(padded))
+        if not isinstance(product_id, str):
+            raise TypeError(product_id)
+        product_id = UUID(product_id)
+    except (ValueError, TypeError):
+        raise ValueError("Cursor inválido")
+    if cursor_sort != sort:
+        raise ValueError("El cursor no corresponde al orden solicitado")
+    if not _valid_cursor_value(sort, value):
+        raise ValueError("Cursor inválido")
+    return value, product_id
+
+
+def list_products_page(
+    db: Session,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    sort: str = "name",
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    in_stock: bool = False,
+    name_prefix: Optional[str] = None,
+) -> Tuple[List[Product], Optional[str]]:
+    """
+    Devuelve una página de productos activos y el cursor de la siguiente (o None).
+    La posición se expresa como (valor de orden, id), así que el costo no depende
+    de la profundidad de la página.
+    """
+    if sort not in PRODUCT_SORTS:
+        raise ValueError(f"Orden no soportado: {sort}")
+    column, descending = PRODUCT_SORTS[sort]
+
+    query = db.query(Product).filter(Product.is_active == True)
+    if min_price is not None:
+        query = query.filter(Product.price >= min_price)
+    if max_price is not None:
+        query = query.filter(Product.price <= max_price)
+    if in_stock:
+        query = query.filter(Product.stock > 0)
+    if name_prefix:
+        escaped = name_prefix.lower().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        query = query.filter(func.lower(Product.name).like(f"{escaped}%", escape="\\"))
+
+    if cursor:
+        value, last_id = _decode_cursor(cursor, sort)
+        position = tuple_(column, Product.id)
+        query = query.filter(position < tuple_(value, last_id) if descending else position > tuple_(value, last_id))
+
+    if descending:
+        query = query.order_by(column.desc(), Product.id.desc())
+    else:
+        query = query.order_by(column.asc(), Product.id.asc())
+
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, _encode_cursor(sort, getattr(last, column.key), last.id)
+
 def get_product_by_id(db: Session, product_id: str) -> Optional[Product]:
     return db.query(Product).filter(Product.id == product_id).first()
 
-def update_product(db: Session, product_id: str, product_in: ProductUpdate) -> Product:
+def update_product(db: Session, product_id: str, product_in: ProductUpdate) -> Tuple[Product, Optional[str]]:
+    """Actualiza el producto; devuelve también el id del trabajo de imagen (o None)."""
     product = get_product_by_id(db, product_id)
     if not product:
         raise ValueError(f"Producto con ID {product_id} no encontrado")
 
-    for field, value in product_in.dict(exclude_unset=True).items():
+    data = product_in.model_dump(exclude_unset=True)
+    image_base64 = data.pop("image_base64", None)
+    image_url = data.pop("image_url", None)
+
+    old_price = product.price
+    for field, value in data.items():
         setattr(product, field, value)
+    if "price" in data:
+        # Los carritos que lo contienen ajustan su subtotal en la misma transacción
+        apply_price_change(db, product.id, old_price, product.price)
+    if image_url:
+        _apply_image_urls(product, {"small": image_url, "thumbnail": image_url, "medium": image_url})
 
     db.commit()
     db.refresh(product)
-    return product
+    invalidate_catalog_cache()
+
+    image_job_id = enqueue_product_image(str(product.id), image_base64).id if image_base64 else None
+    return product, image_job_id
+
+def replace_product_image(db: Session, product_id: str, image_path: Path) -> Tuple[Product, str]:
+    """
+    Encola el reemplazo de la imagen de un producto a partir de un archivo subido.
+    Devuelve el producto y el id del trabajo de imagen.
+    """
+    product = get_product_by_id(db, product_id)
+    if not product:
+        raise ValueError(f"Producto con ID {product_id} no encontrado")
+    return product, enqueue_product_image_file(str(product.id), image_path).id
 
 def delete_product(db: Session, product_id: str):
     product = get_product_by_id(db, product_id)
@@ -135,6 +397,7 @@ def delete_product(db: Session, product_id: str):
     product.is_active = False
     db.commit()
     db.refresh(product)
+    invalidate_catalog_cache()
     return {"message": f"Producto {product_id} eliminado correctamente"}
 
 # -------------------------
@@ -166,4 +429,5 @@ def update_stock_after_purchase(db: Session, user_id: str):
         logger.info(f"Stock actualizado para {product.name}: ahora {product.stock} unidades")
 
     db.commit()
+    invalidate_catalog_cache()
     logger.info(f"Stock actualizado correctamente para usuario {user_id}")
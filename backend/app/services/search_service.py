@@ -0,0 +1,193 @@
+# app/services/search_service.py
+import bisect
+import heapq
+import math
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+from uuid import UUID
+
+from pydantic import TypeAdapter
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.models.product import Product, SEARCH_CONFIG, product_search_vector
+from app.schemas.product_schema import ProductResponse
+from app.services.product_service import catalog_cache
+
+_TOKEN_RE = re.compile(r"\w+")
+
+# Peso de cada campo en el índice en memoria (equivalente a setweight 'A' / 'B')
+NAME_WEIGHT = 2.0
+DESCRIPTION_WEIGHT = 1.0
+
+# Tokens que se expanden como máximo para el prefijo del último término
+MAX_PREFIX_EXPANSION = 32
+
+
+def tokenize(text: Optional[str], strip_accents: bool = True) -> List[str]:
+    """Minúsculas y solo caracteres de palabra; opcionalmente sin acentos."""
+    if not text:
+        return []
+    text = text.lower()
+    if strip_accents:
+        normalized = unicodedata.normalize("NFKD", text)
+        text = "".join(ch for ch in normalized if not unicodedata.combining(ch))
+    return _TOKEN_RE.findall(text)
+
+
+# -------------------------
+# Índice invertido en memoria (SQLite / tests)
+# -------------------------
+class InvertedIndex:
+    """
+    Índice invertido token -> {product_id: peso}.
+    Todos los términos de la consulta son obligatorios; el último se trata como
+    prefijo (búsqueda mientras se escribe). El ranking es TF ponderado por IDF.
+    """
+
+    def __init__(self):
+        self._postings: Dict[str, Dict[UUID, float]] = {}
+        self._vocabulary: List[str] = []
+        self.size = 0
+
+    def build(self, rows: Iterable[Tuple[UUID, str, Optional[str]]]) -> "InvertedIndex":
+        postings: Dict[str, Dict[UUID, float]] = defaultdict(dict)
+        size = 0
+        for product_id, name, description in rows:
+            size += 1
+            for token in tokenize(name):
+                postings[token][product_id] = postings[token].get(product_id, 0.0) + NAME_WEIGHT
+            for token in tokenize(description):
+                postings[token][product_id] = postings[token].get(product_id, 0.0) + DESCRIPTION_WEIGHT
+        self._postings = dict(postings)
+        self._vocabulary = sorted(self._postings)
+        self.size = size
+        return self
+
+    def _prefix_postings(self, prefix: str) -> Dict[UUID, float]:
+        """
+        Une las listas de los tokens que empiezan por el prefijo.
+        Se expanden como máximo MAX_PREFIX_EXPANSION tokens (el exacto y los más frecuentes)
+        para acotar la latencia de prefijos cortos.
+        """
+        start = bisect.bisect_left(self._vocabulary, prefix)
+        end = bisect.bisect_left(self._vocabulary, prefix + "\U0010ffff", lo=start)
+        tokens = self._vocabulary[start:end]
+        if not tokens:
+            return {}
+        if len(tokens) > MAX_PREFIX_EXPANSION:
+            tokens.sort(key=lambda token: (token != prefix, -len(self._postings[token])))
+            tokens = tokens[:MAX_PREFIX_EXPANSION]
+        if len(tokens) == 1:
+            return self._postings[tokens[0]]
+
+        lists = sorted((self._postings[token] for token in tokens), key=len, reverse=True)
+        merged = dict(lists[0])
+        for postings in lists[1:]:
+            for product_id, weight in postings.items():
+                if weight > merged.get(product_id, 0.0):
+                    merged[product_id] = weight
+        return merged
+
+    def search(self, query: str, limit: int = 20) -> List[Tuple[UUID, float]]:
+        terms = tokenize(query)
+        if not terms or not self.size:
+            return []
+
+        term_postings = [self._postings.get(term, {}) for term in terms[:-1]]
+        term_postings.append(self._prefix_postings(terms[-1]))
+        if any(not postings for postings in term_postings):
+            return []
+
+        # Intersección empezando por la lista más corta
+        term_postings.sort(key=len)
+        candidates = set(term_postings[0])
+        for postings in term_postings[1:]:
+            candidates.intersection_update(postings)
+            if not candidates:
+                return []
+
+        weighted = [(postings, math.log(1 + self.size / len(postings))) for postings in term_postings]
+        scores = (
+            (product_id, sum(postings[product_id] * idf for postings, idf in weighted))
+            for product_id in candidates
+        )
+        return heapq.nlargest(limit, scores, key=lambda item: item[1])
+
+
+_product_list_adapter = TypeAdapter(List[ProductResponse])
+
+_index_lock = threading.Lock()
+_memory_index: Optional[InvertedIndex] = None
+_memory_index_version = -1
+
+
+def _get_memory_index(db: Session) -> InvertedIndex:
+    """Reconstruye el índice en memoria cuando cambia la versión del catálogo."""
+    global _memory_index, _memory_index_version
+    with _index_lock:
+        version = catalog_cache.version
+        if _memory_index is None or _memory_index_version != version:
+            rows = db.query(Product.id, Product.name, Product.description).filter(Product.is_active == True)
+            _memory_index = InvertedIndex().build(rows)
+            _memory_index_version = version
+        return _memory_index
+
+
+# -------------------------
+# Búsqueda pública
+# -------------------------
+def _to_prefix_tsquery(query: str) -> Optional[str]:
+    """'zapato roj' -> 'zapato & roj:*' (tokens saneados, seguro para to_tsquery)."""
+    # La config 'simple' de PostgreSQL conserva los acentos
+    terms = tokenize(query, strip_accents=False)
+    if not terms:
+        return None
+    terms[-1] = f"{terms[-1]}:*"
+    return " & ".join(terms)
+
+
+def search_products(db: Session, query: str, limit: int = 20) -> List[Product]:
+    """
+    Busca productos activos por nombre y descripción, ordenados por relevancia.
+    PostgreSQL usa el índice GIN sobre el tsvector; otros motores, el índice en memoria.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        tsquery_text = _to_prefix_tsquery(query)
+        if not tsquery_text:
+            return []
+        vector = product_search_vector(Product.name, Product.description)
+        tsquery = func.to_tsquery(SEARCH_CONFIG, tsquery_text)
+        return (
+            db.query(Product)
+            .filter(Product.is_active == True, vector.op("@@")(tsquery))
+            .order_by(func.ts_rank_cd(vector, tsquery).desc(), Product.id)
+            .limit(limit)
+            .all()
+        )
+
+    ranked = _get_memory_index(db).search(query, limit=limit)
+    if not ranked:
+        return []
+    ids = [product_id for product_id, _ in ranked]
+    products = {p.id: p for p in db.query(Product).filter(Product.id.in_(ids), Product.is_active == True)}
+    return [products[product_id] for product_id in ids if product_id in products]
+
+
+def get_search_json(db: Session, query: str, limit: int = 20) -> bytes:
+    """Resultados de search_products serializados a JSON, cacheados por versión del catálogo."""
+    key = ("search", " ".join(tokenize(query, strip_accents=False)), limit)
+    version = catalog_cache.version
+    cached = catalog_cache.get(key)
+    if cached is not None:
+        return cached
+
+    products = search_products(db, query, limit=limit)
+    body = _product_list_adapter.dump_json(
+        _product_list_adapter.validate_python(products, from_attributes=True)
+    )
+    catalog_cache.set(key, body, version=version)
+    return body
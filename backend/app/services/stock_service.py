@@ -0,0 +1,152 @@
+# app/services/stock_service.py
+from dataclasses import dataclass, field
+from typing import Dict, List
+from uuid import UUID
+
+from sqlalchemy import Integer, column, select, update, values
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID
+from sqlalchemy.orm import Session
+
+from app.core.logger import logger
+from app.models.product import Product
+from app.services.product_service import invalidate_catalog_cache
+
+
+@dataclass
+class StockReservation:
+    """Resultado de reserve_stock: si falla alguna línea no se reserva ninguna."""
+
+    quantities: Dict[UUID, int]
+    failures: List[Dict] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return not self.failures
+
+
+def _lines(quantities: Dict[UUID, int]):
+    """(VALUES (:id, :qty), ...) AS v (id, qty), ordenado por id."""
+    return values(column("id", PG_UUID(as_uuid=True)), column("qty", Integer), name="v").data(
+        [(product_id, quantities[product_id]) for product_id in sorted(quantities, key=str)]
+    )
+
+
+def _decrement_statement(quantities: Dict[UUID, int]):
+    """
+    PostgreSQL: una sola sentencia para todas las líneas.
+
+        UPDATE products SET stock = stock - v.qty
+        FROM (VALUES (:id, :qty), ...) AS v (id, qty)
+        WHERE products.id = v.id AND products.stock >= v.qty AND products.id IN (
+            SELECT id FROM products WHERE id IN (...) ORDER BY id FOR UPDATE
+        )
+        RETURNING products.id, products.stock
+
+    Las filas se bloquean en orden de id para que dos checkouts con los mismos
+    productos no se bloqueen mutuamente (deadlock).
+    """
+    lines = _lines(quantities)
+    locked = select(Product.id).where(Product.id.in_(list(quantities))).order_by(Product.id).with_for_update()
+    return (
+        update(Product)
+        .where(
+            Product.id == lines.c.id,
+            Product.stock >= lines.c.qty,
+            Product.is_active == True,
+            Product.id.in_(locked),
+        )
+        .values(stock=Product.stock - lines.c.qty)
+        .returning(Product.id, Product.stock)
+    )
+
+
+def _decrement(db: Session, quantities: Dict[UUID, int]) -> Dict[UUID, int]:
+    """Descuenta las cantidades que caben en el stock; devuelve {product_id: stock restante}."""
+    if db.get_bind().dialect.name == "postgresql":
+        rows = db.execute(_decrement_statement(quantities), execution_options={"synchronize_session": False})
+        return {row.id: row.stock for row in rows}
+
+    # Otros motores (SQLite): un UPDATE condicional por línea, en la misma transacción
+    remaining = {}
+    for product_id in sorted(quantities, key=str):
+        quantity = quantities[product_id]
+        updated = db.execute(
+            update(Product)
+            .where(Product.id == product_id, Product.stock >= quantity, Product.is_active == True)
+            .values(stock=Product.stock - quantity)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if updated:
+            remaining[product_id] = db.query(Product.stock).filter(Product.id == product_id).scalar()
+    return remaining
+
+
+def reserve_stock(db: Session, quantities: Dict[UUID, int]) -> StockReservation:
+    """
+    Reserva (descuenta) el stock de todas las líneas de forma atómica: cada
+    descuento es condicional (stock >= cantidad), así que dos checkouts
+    concurrentes nunca venden más de lo que hay. Si alguna línea no alcanza se
+    deshace todo y se informa de cada línea fallida con el stock disponible.
+    Hace commit (o rollback).
+    """
+    quantities = {product_id: quantity for product_id, quantity in quantities.items() if quantity > 0}
+    reservation = StockReservation(quantities)
+    if not quantities:
+        return reservation
+
+    try:
+        reserved = _decrement(db, quantities)
+        missing = [product_id for product_id in quantities if product_id not in reserved]
+        if not missing:
+            db.commit()
+            invalidate_catalog_cache()
+            return reservation
+        db.rollback()
+    except Exception:
+        db.rollback()
+        raise
+
+    available = {
+        row.id: row
+        for row in db.query(Product.id, Product.name, Product.stock, Product.is_active).filter(Product.id.in_(missing))
+    }
+    for product_id in missing:
+        row = available.get(product_id)
+        reservation.failures.append({
+            "product_id": str(product_id),
+            "product_name": row.name if row else None,
+            "requested": quantities[product_id],
+            "available": row.stock if row and row.is_active else 0,
+            "error": "Stock insuficiente" if row and row.is_active else "Producto no disponible",
+        })
+    db.rollback()
+    logger.info(f"Reserva de stock rechazada: {len(missing)} de {len(quantities)} líneas sin stock")
+    return reservation
+
+
+def release_stock(db: Session, reservation: StockReservation):
+    """Devuelve al stock una reserva confirmada (p. ej. pago rechazado). Hace commit."""
+    if not reservation.ok or not reservation.quantities:
+        return
+    quantities = reservation.quantities
+    try:
+        if db.get_bind().dialect.name == "postgresql":
+            lines = _lines(quantities)
+            db.execute(
+                update(Product).where(Product.id == lines.c.id).values(stock=Product.stock + lines.c.qty),
+                execution_options={"synchronize_session": False},
+            )
+        else:
+            for product_id in sorted(quantities, key=str):
+                db.execute(
+                    update(Product)
+                    .where(Product.id == product_id)
+                    .values(stock=Product.stock + quantities[product_id])
+                    .execution_options(synchronize_session=False)
+                )
+        db.commit()
+    except Exception:
+        db.rollback()
+        logger.exception(f"No se pudo liberar la reserva de stock: {quantities}")
+        raise
+    invalidate_catalog_cache()
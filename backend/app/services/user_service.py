@@ -1,8 +1,9 @@
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from typing import Optional, List
 from app.models.user import User
 from app.schemas.user_schema import UserCreate
-from app.core.security import get_password_hash
+from app.core.security import get_password_hash_async
 
 def get_user_by_id(db: Session, user_id: int) -> Optional[User]:
     return db.query(User).filter(User.id == user_id).first()
@@ -10,18 +11,22 @@ def get_user_by_id(db: Session, user_id: int) -> Optional[User]:
 def get_user_by_email(db: Session, email: str) -> Optional[User]:
     return db.query(User).filter(User.email == email).first()
 
-def create_user(db: Session, user_in: UserCreate) -> User:
-    hashed_password = get_password_hash(user_in.password)
+def _save_user(db: Session, user: User) -> User:
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    return user
+
+async def create_user(db: Session, user_in: UserCreate) -> User:
+    """bcrypt en el executor de password_hasher; la escritura, en el threadpool."""
+    hashed_password = await get_password_hash_async(user_in.password)
     user = User(
         email=user_in.email,
         full_name=user_in.full_name,
         hashed_password=hashed_password,
         is_admin=user_in.is_admin,
     )
-    db.add(user)
-    db.commit()
-    db.refresh(user)
-    return user
+    return await run_in_threadpool(_save_user, db, user)
 
 def list_users(db: Session) -> List[User]:
     return db.query(User).all()
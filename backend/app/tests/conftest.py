@@ -0,0 +1,52 @@
+# app/tests/conftest.py
+"""
+Los tests usan una base SQLite temporal: la URL se fija antes de importar la
+app (settings se lee al importar app.core.config).
+
+    cd backend && python -m pytest app/tests
+"""
+import os
+import tempfile
+import uuid
+
+_TEST_DIR = tempfile.mkdtemp(prefix="eshop-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_TEST_DIR, 'test.db')}"
+os.environ.setdefault("ENVIRONMENT", "test")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+import pytest
+
+from app.core.database import SessionLocal, init_db
+from app.models.product import Product
+from app.models.user import User
+
+init_db()
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.rollback()
+        session.close()
+
+
+@pytest.fixture
+def make_product(db):
+    def _make(name=None, price=10.0, stock=10, **fields):
+        fields.setdefault("is_active", True)
+        product = Product(name=name or f"p-{uuid.uuid4().hex[:8]}", price=price, stock=stock, **fields)
+        db.add(product)
+        db.commit()
+        return product
+    return _make
+
+
+@pytest.fixture
+def user(db):
+    user = User(full_name="Test", email=f"{uuid.uuid4().hex[:12]}@test.com", hashed_password="x")
+    db.add(user)
+    db.commit()
+    return user